@@ -37,11 +37,15 @@ CAMERA_SPEED, CAMERA_WIDTH, CAMERA_HEIGHT = 3, 600, 500
 WORLD_BORDER = 5
 CENTER = 0  # Defines drawing ellipse from their center.
 
+# Network.
+PLAN_CACHE_SIZE = 1024  # Compiled network structures kept for reuse.
+
 # Simulation.
 SIMULATION_WIDTH, SIMULATION_HEIGHT = 3000, 3000
 FOOD_TIME_START = 30  # Seconds.
 SIMULATION_REPORT = "Generation {} | simulation time: {} | population {} | species {} | current best {}"
 PRINT_FREQUENCY = 10  # Frames.
+NEIGHBOUR_BACKEND = 'grid'  # 'grid' spatial hash, or 'kdtree' for large populations (requires scipy).
 
 # Colors.
 BLACK = 0, 0, 0
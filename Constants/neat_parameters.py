@@ -2,14 +2,12 @@
 # Description: neat algorithm configurations.
 # ---------------------------------------------------------------------------------------------------------------------
 
-# Imports.
-import math
-
-
 # Activation function
-def sigmoid(x: float) -> float:
-    return 1.0 / (1.0 + pow(math.e, -4.9 * x))
-
+ACTIVATION = 'sigmoid'
+LOOKUP_TABLE = False  # Evaluate bounded activations from a precomputed table.
+LOOKUP_TABLE_SIZE = 4097
+LOOKUP_TABLE_LIMIT = 4.0  # The table covers [-limit, limit], values outside are clamped to its edges.
+LOOKUP_TABLE_LIMITS = {'tanh': 8.0}  # Limits of activations that saturate slower, so clamping stays within ~1e-6.
 
 # General
 POPULATION_SIZE = 15
@@ -21,6 +19,7 @@ MAX_AGE = 5000
 BOTTOM_PERCENT = 0.1
 BIG_SPECIES = 5
 NEW_CHILDREN = 1
+INNOVATION_GENERATIONS = None  # Generations an innovation is matched against, None matches it for the whole run.
 
 # New Creature
 CROSSOVER_RATE = 0.75
@@ -0,0 +1,90 @@
+# activations.py
+# Description: activation functions for networks.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from typing import Callable, Union
+
+import numpy as np
+
+# Constants
+from Constants.neat_parameters import ACTIVATION, LOOKUP_TABLE, LOOKUP_TABLE_SIZE, LOOKUP_TABLE_LIMIT, \
+    LOOKUP_TABLE_LIMITS
+
+
+# Activation functions, all work on floats and numpy arrays.
+def sigmoid(x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    """
+    The steepened sigmoid from the NEAT paper, 1 / (1 + e^(-4.9x)), written with tanh so it never overflows.
+    """
+    return 0.5 + 0.5 * np.tanh(2.45 * x)
+
+
+def tanh(x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    return np.tanh(x)
+
+
+def relu(x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    return np.maximum(x, 0.0)
+
+
+class Activation:
+    """
+    A named activation function. Bounded activations can be replaced by a precomputed lookup table, evaluated with
+    linear interpolation and clamped to the table's edges outside of it.
+    """
+
+    def __init__(self, name: str, function: Callable[[np.ndarray], np.ndarray], bounded: bool,
+                 lookup_table: bool = LOOKUP_TABLE):
+        self.name = name
+        self.function = function
+        self.bounded = bounded
+        self.table = self.slopes = None
+        if lookup_table and bounded:
+            self.build_table()
+
+    def __str__(self):
+        return "<{} {}{}>".format(self.__class__.__name__, self.name, ' (table)' if self.table is not None else '')
+
+    def __repr__(self):
+        return str(self)
+
+    def __call__(self, x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        if self.table is None:
+            return self.function(x)
+        return self.lookup(x)
+
+    def build_table(self, size: int = LOOKUP_TABLE_SIZE, limit: float = None) -> None:
+        """
+        Samples the function evenly between -limit and limit. The limit defaults to the activation's own limit, which
+        is where it is saturated enough that clamping costs no more than interpolating.
+        """
+        self.limit = limit or LOOKUP_TABLE_LIMITS.get(self.name, LOOKUP_TABLE_LIMIT)
+        self.step = 2 * self.limit / (size - 1)
+        self.table = self.function(np.linspace(-self.limit, self.limit, size))
+        self.slopes = np.diff(self.table)
+
+    def lookup(self, x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """
+        Evaluates the function from the lookup table.
+        """
+        position = np.clip((np.asarray(x) + self.limit) / self.step, 0, len(self.table) - 1)
+        index = np.minimum(position.astype(int), len(self.table) - 2)
+        return self.table[index] + self.slopes[index] * (position - index)
+
+
+# Registry of all activations by name.
+ACTIVATIONS = {activation.name: activation for activation in [
+    Activation('sigmoid', sigmoid, bounded=True),
+    Activation('tanh', tanh, bounded=True),
+    Activation('relu', relu, bounded=False)
+]}
+DEFAULT_ACTIVATION = ACTIVATIONS[ACTIVATION]
+
+
+if __name__ == '__main__':
+    table_sigmoid = Activation('sigmoid', sigmoid, bounded=True, lookup_table=True)
+    table_tanh = Activation('tanh', tanh, bounded=True, lookup_table=True)
+    xs = np.linspace(-10, 10, 10001)
+    print("Max table error:", np.abs(table_sigmoid(xs) - sigmoid(xs)).max(), np.abs(table_tanh(xs) - tanh(xs)).max())
+    print(sigmoid(-1000.0), table_sigmoid(-1000.0), sigmoid(0.1), table_sigmoid(0.1))
@@ -11,6 +11,10 @@ from Constants.neat_parameters import WEIGHT_RANGE
 
 
 class Connection:
+    """
+    A connection gene, dnas build connections from their gene arrays whenever they are asked for.
+    """
+    __slots__ = 'number', 'src_number', 'dst_number', 'weight', 'enabled'
 
     def __init__(self, number: Union[int, None], src_number: Union[int, None], dst_number: Union[int, None],
                  weight: float = None, enabled: bool = True):
@@ -22,6 +26,16 @@ class Connection:
         self.weight = weight if weight else random.random() * WEIGHT_RANGE * 2 - WEIGHT_RANGE
         self.enabled = enabled
 
+    @classmethod
+    def gene(cls, number: int, src_number: int, dst_number: int, weight: float, enabled: bool) -> 'Connection':
+        """
+        Builds a connection from the values of its gene, a zero weight stays zero.
+        """
+        connection = cls.__new__(cls)
+        connection.number, connection.src_number, connection.dst_number = number, src_number, dst_number
+        connection.weight, connection.enabled = weight, enabled
+        return connection
+
     def __str__(self):
         return CONNECTION_STRING.format(self.number, '+' if self.enabled else '-',
                                         self.src_number, self.weight, self.dst_number)
@@ -5,6 +5,8 @@
 # Imports
 from typing import List, Union
 
+import numpy as np
+
 # Constants
 from Constants.constants import CREATURE_STRING, CREATURE_BODY, CREATURE_REACH, CREATURE_LINE_OF_SIGHT
 from Constants.data_structures import CreatureNetworkInput, CreatureNetworkOutput
@@ -26,7 +28,7 @@ class Creature:
         self.dna = dna
         self.age = 0
         self.distance_travelled = 0
-        self.network = Network(self.dna.nodes, self.dna.node_connections)
+        self.network = Network(self.dna)
 
         if colors is None:
             colors = list()
@@ -54,9 +56,17 @@ class Creature:
         """
         return CreatureNetworkOutput(*self.network.get_output(list(inputs)))
 
+    def think_batch(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        Gets the creature decisions about everything it sees in a single network evaluation.
+        :param inputs: An (N, CreatureNetworkInput) matrix of sensory inputs.
+        :return: An (N, CreatureNetworkOutput) matrix of decisions.
+        """
+        return self.network.get_output_batch(inputs)
+
     def update(self, mutations: List[Union[MutationObject]]):
         self.dna.update(mutations)
-        self.network = Network(self.dna.nodes, self.dna.node_connections)
+        self.network.update(self.dna, mutations)
 
 
 if __name__ == '__main__':
@@ -3,7 +3,10 @@
 # ---------------------------------------------------------------------------------------------------------------------
 
 # Imports
-from typing import Dict, Tuple, Type, List
+from random import randrange
+from typing import Dict, Iterator, Optional, Set, Tuple, Type, List
+
+import numpy as np
 
 # Constants
 from Constants.constants import DNA_STRING
@@ -11,39 +14,299 @@ from Constants.neat_parameters import BIAS_RANGE
 from Constants.types import NodeObject
 # Objects
 from connection import Connection
+from activations import ACTIVATIONS
 from functions import dict_string
 from mutations import WeightMutation, BiasMutation, ConnectionMutation, NodeMutation, MutationObject
-from node import InputNode, HiddenNode, OutputNode
+from node import InputNode, HiddenNode, OutputNode, NODE_TYPES
+
+# Genes are packed into structured arrays sorted by number, a connection gene is 25 bytes, a node gene 14.
+CONNECTION_GENE = np.dtype([('number', np.int64), ('src', np.int32), ('dst', np.int32), ('weight', np.float64),
+                            ('enabled', np.bool_)])
+NODE_GENE = np.dtype([('number', np.int32), ('kind', np.int8), ('activation', np.int8), ('bias', np.float64)])
+
+# Activations by the index node genes store.
+GENE_ACTIVATIONS = tuple(ACTIVATIONS.values())
 
 
 class Dna:
+    """
+    Keeps its genes in two structured arrays, connection genes and node genes. Nodes and connections are built from the
+    arrays when they are asked for, changing them doesn't change the dna. Gene arrays are never changed in place, every
+    change replaces them, so copies share them until one of the copies mutates.
+    The structure index that connection checks need is built from the arrays the first time it is asked for, see
+    structure, so only dnas that go through structural mutations ever hold one.
+    """
+    __slots__ = 'connection_genes', 'node_genes', 'index'
 
     def __init__(self, inputs: int = None, outputs: int = None, nodes: Dict[int, NodeObject] = None,
                  connections: Dict[int, Connection] = None):
 
-        # Take input & output node amount if given, else take values.
-        self.inputs = len([node for node in nodes if isinstance(node, InputNode)]) if nodes else inputs
-        self.outputs = len([node for node in nodes if isinstance(node, OutputNode)]) if nodes else outputs
-
         # Generate nodes if not given any.
-        self.nodes = nodes or self.generate_nodes()
-        self.input_nodes = self.get_node_by_type(InputNode)
-        self.hidden = 0
-        self.output_nodes = self.get_node_by_type(OutputNode)
+        nodes = nodes or self.generate_nodes(inputs, outputs)
+        self.node_genes = np.array(sorted(self.node_gene(node) for node in nodes.values()), dtype=NODE_GENE)
 
         # Do NOT generate connections unless given.
-        self.connections = connections or dict()
-        self.update_connections()
+        connections = connections or dict()
+        self.connection_genes = np.array(sorted(self.connection_gene(connection)
+                                                for connection in connections.values()), dtype=CONNECTION_GENE)
+        self.index = None
+
+    @staticmethod
+    def node_gene(node: NodeObject) -> Tuple[int, int, int, float]:
+        return node.number, node.kind, GENE_ACTIVATIONS.index(node.activation), node.bias
+
+    @staticmethod
+    def connection_gene(connection: Connection) -> Tuple[int, int, int, float, bool]:
+        return connection.number, connection.src_number, connection.dst_number, connection.weight, connection.enabled
+
+    @staticmethod
+    def with_gene(genes: np.ndarray, gene: tuple) -> np.ndarray:
+        """
+        Returns a copy of genes with gene in place of the gene with the same number, or inserted in order.
+        """
+        index = np.searchsorted(genes['number'], gene[0])
+        if index < len(genes) and genes['number'][index] == gene[0]:
+            genes = genes.copy()
+            genes[index] = gene
+            return genes
+        return np.insert(genes, index, np.array(gene, dtype=genes.dtype))
+
+    @staticmethod
+    def with_value(genes: np.ndarray, number: int, field: str, value) -> np.ndarray:
+        """
+        Returns a copy of genes with one field of the gene with the given number changed.
+        """
+        genes = genes.copy()
+        genes[field][np.searchsorted(genes['number'], number)] = value
+        return genes
+
+    @staticmethod
+    def gene_values(genes: np.ndarray) -> Iterator[tuple]:
+        """
+        The values of every gene as a tuple, read one field at a time, which is faster than converting the structured
+        array as a whole.
+        """
+        return zip(*(genes[field].tolist() for field in genes.dtype.names))
+
+    @staticmethod
+    def edge_key(src, dst):
+        """
+        Packs (src, dst) node numbers into one sortable integer, node numbers fit in 32 bits. Works on Python ints and
+        on int64 arrays.
+        """
+        return (src << 32) | dst
+
+    def structure(self) -> Tuple[np.ndarray, np.ndarray, Tuple[List[int], ...]]:
+        """
+        Indexes the structure of the genes: the sorted keys of all connected (src, dst) pairs, disabled connections
+        included, the position of the gene of each key, and the sorted node numbers of each kind, by kind.
+        The index is built the first time it is asked for and dropped by structural changes, copies share it.
+        """
+        if self.index is None:
+            keys, genes = np.unique(self.edge_key(self.connection_genes['src'].astype(np.int64),
+                                                  self.connection_genes['dst']), return_index=True)
+            kinds = self.node_genes['kind']
+            self.index = keys, genes, tuple(self.node_genes['number'][kinds == node_type.kind].tolist()
+                                            for node_type in NODE_TYPES)
+        return self.index
+
+    def edge_gene(self, src_number: int, dst_number: int) -> Optional[int]:
+        """
+        Returns the position of the gene connecting src_number to dst_number, or None if they aren't connected.
+        """
+        keys, genes, _ = self.structure()
+        key = self.edge_key(src_number, dst_number)
+        position = int(keys.searchsorted(key))
+        return int(genes[position]) if position < len(keys) and keys[position] == key else None
+
+    @property
+    def innovations(self) -> np.ndarray:
+        """
+        Sorted innovation numbers of the connection genes.
+        """
+        return self.connection_genes['number']
+
+    @property
+    def weights(self) -> np.ndarray:
+        """
+        Weights of the connection genes, in the order of innovations.
+        """
+        return self.connection_genes['weight']
+
+    def node_numbers(self, node_type: Type[NodeObject]) -> List[int]:
+        """
+        Numbers of all nodes of type node_type, sorted.
+        """
+        return self.node_genes['number'][self.node_genes['kind'] == node_type.kind].tolist()
+
+    @property
+    def inputs(self) -> int:
+        return int(np.count_nonzero(self.node_genes['kind'] == InputNode.kind))
+
+    @property
+    def hidden(self) -> int:
+        return int(np.count_nonzero(self.node_genes['kind'] == HiddenNode.kind))
+
+    @property
+    def outputs(self) -> int:
+        return int(np.count_nonzero(self.node_genes['kind'] == OutputNode.kind))
+
+    @property
+    def nodes(self) -> Dict[int, NodeObject]:
+        """
+        All nodes by number.
+        """
+        return {number: NODE_TYPES[kind].gene(number, bias, GENE_ACTIVATIONS[activation])
+                for number, kind, activation, bias in self.gene_values(self.node_genes)}
+
+    @property
+    def connections(self) -> Dict[int, Connection]:
+        """
+        All connections by innovation number.
+        """
+        return {gene[0]: Connection.gene(*gene) for gene in self.gene_values(self.connection_genes)}
+
+    @property
+    def input_nodes(self) -> Tuple[NodeObject]:
+        return self.get_node_by_type(InputNode)
+
+    @property
+    def hidden_nodes(self) -> Tuple[NodeObject]:
+        return self.get_node_by_type(HiddenNode)
+
+    @property
+    def output_nodes(self) -> Tuple[NodeObject]:
+        return self.get_node_by_type(OutputNode)
+
+    @property
+    def incoming(self) -> Dict[int, List[Connection]]:
+        """
+        Connections going into each node, by node number.
+        """
+        return self.node_connections_by('dst')
+
+    @property
+    def outgoing(self) -> Dict[int, List[Connection]]:
+        """
+        Connections going out of each node, by node number.
+        """
+        return self.node_connections_by('src')
+
+    def node_connections_by(self, end: str) -> Dict[int, List[Connection]]:
+        """
+        Maps every node number to the connections that have it as their end ('src' or 'dst').
+        """
+        node_connections: Dict[int, List[Connection]] = {number: [] for number in self.node_genes['number'].tolist()}
+        for connection in self.connections.values():
+            node_connections[connection.src_number if end == 'src' else connection.dst_number].append(connection)
+        return node_connections
 
-    def update_connections(self) -> None:
+    @property
+    def edges(self) -> Set[Tuple[int, int]]:
         """
-        Generates main__a dictionary mapping nodes to all their connections.
+        All connected (src, dst) node number pairs.
         """
-        self.node_connections = {node: self.get_node_connections(node) for node in self.nodes.values()}
+        return set(zip(self.connection_genes['src'].tolist(), self.connection_genes['dst'].tolist()))
+
+    def connection_at(self, gene: int) -> Connection:
+        """
+        Builds the connection of the gene at position gene, in the order of innovations.
+        """
+        return Connection.gene(*self.connection_genes[gene].tolist())
+
+    def connection_between(self, src_number: int, dst_number: int) -> Optional[Connection]:
+        """
+        Builds the connection from src_number to dst_number, or returns None if there isn't one.
+        """
+        gene = self.edge_gene(src_number, dst_number)
+        return None if gene is None else self.connection_at(gene)
+
+    def compare_genes(self, other: 'Dna') -> Tuple[np.ndarray, np.ndarray, np.ndarray, int, float]:
+        """
+        Compares the connection genes of two dnas with a merge of their sorted innovation numbers, so the cost
+        depends on the size of the genomes and not on how many innovations happened.
+        Genes both dnas have are matching, the rest are disjoint if their number is lower than the smaller of the two
+        latest innovations and excess otherwise.
+        :return: matching, disjoint and excess innovation numbers, the latest innovation number and the average weight
+        difference of matching genes (nan if there are none).
+        """
+        self_innovations, other_innovations = self.innovations, other.innovations
+        matching, self_index, other_index = np.intersect1d(self_innovations, other_innovations, assume_unique=True,
+                                                           return_indices=True)
+        non_matching = np.setxor1d(self_innovations, other_innovations, assume_unique=True)
+        cutoff = min(self_innovations[-1], other_innovations[-1])
+        max_number = max(self_innovations[-1], other_innovations[-1])
+
+        delta_weights = np.abs(self.weights[self_index] - other.weights[other_index]).mean() if len(matching) \
+            else float('nan')
+        return matching, non_matching[non_matching < cutoff], non_matching[non_matching >= cutoff], int(max_number), \
+            float(delta_weights)
+
+    def add_connection(self, connection: Connection) -> None:
+        """
+        Adds a connection, replacing the connection with the same number if there is one.
+        """
+        self.connection_genes = self.with_gene(self.connection_genes, self.connection_gene(connection))
+        self.index = None
+
+    def add_node(self, node: NodeObject) -> None:
+        """
+        Adds a node, replacing the node with the same number if there is one.
+        """
+        self.node_genes = self.with_gene(self.node_genes, self.node_gene(node))
+        self.index = None
+
+    def set_values(self, weights: Dict[int, float] = None, biases: Dict[int, float] = None) -> None:
+        """
+        Sets connection weights and node biases by number, replacing each gene array once. Weights and biases don't
+        change the structure, so mutations that only change them don't need mutation objects.
+        """
+        for genes, field, values in (('connection_genes', 'weight', weights), ('node_genes', 'bias', biases)):
+            if values:
+                array = getattr(self, genes).copy()
+                array[field][np.searchsorted(array['number'], list(values))] = list(values.values())
+                setattr(self, genes, array)
+
+    @property
+    def node_connections(self) -> Dict[NodeObject, Dict[str, Tuple[Connection]]]:
+        """
+        All connections from each node and into each node (src, dst).
+        """
+        outgoing, incoming = self.outgoing, self.incoming
+        return {node: {'src': tuple(outgoing[number]), 'dst': tuple(incoming[number])}
+                for number, node in self.nodes.items()}
+
+    @property
+    def fingerprint(self) -> Tuple[bytes, bytes, bytes]:
+        """
+        The structural fingerprint of the dna, the innovation numbers of all enabled connections and the number and kind
+        of every node. Two dnas with the same fingerprint have the same network structure, weights and biases aside.
+        """
+        return (self.innovations[self.connection_genes['enabled']].tobytes(), self.node_genes['number'].tobytes(),
+                self.node_genes['kind'].tobytes())
+
+    @staticmethod
+    def from_genes(node_genes: np.ndarray, connection_genes: np.ndarray) -> 'Dna':
+        """
+        Builds a dna straight from gene arrays in any order. Of genes with the same number, the first one is kept.
+        """
+        dna = Dna.__new__(Dna)
+        dna.index = None
+        dna.node_genes = node_genes[np.unique(node_genes['number'], return_index=True)[1]]
+        dna.connection_genes = connection_genes[np.unique(connection_genes['number'], return_index=True)[1]]
+        return dna
+
+    def copy(self) -> 'Dna':
+        """
+        Returns a copy of the dna that shares its gene arrays and structure index, they are replaced and never changed
+        in place.
+        """
+        clone = Dna.__new__(Dna)
+        clone.connection_genes, clone.node_genes, clone.index = self.connection_genes, self.node_genes, self.index
+        return clone
 
     def __str__(self):
-        return DNA_STRING.format(len(self.input_nodes), len(self.get_node_by_type(HiddenNode)), len(self.output_nodes),
-                                 dict_string(self.node_connections))
+        return DNA_STRING.format(self.inputs, self.hidden, self.outputs, dict_string(self.node_connections))
 
     def __repr__(self):
         return str(self)
@@ -59,13 +322,13 @@ class Dna:
 
         # Get all possible connections, and remove connections that break the rules.
         available_connections = []
-        connections = [(connection.src_number, connection.dst_number) for connection in self.connections.values()]
-        for src_number in self.nodes:
-            for dst_number in [node_number for node_number in self.nodes if node_number != src_number]:
+        connections, nodes = self.edges, self.nodes
+        for src_number in nodes:
+            for dst_number in [node_number for node_number in nodes if node_number != src_number]:
                 if (src_number, dst_number) not in connections:
-                    dst_type = type(self.nodes[dst_number])
+                    dst_type = type(nodes[dst_number])
                     if dst_type is not InputNode:
-                        src_type = type(self.nodes[src_number])
+                        src_type = type(nodes[src_number])
                         if src_type is not dst_type or src_type is HiddenNode:
                             available_connections.append((src_number, dst_number))
                             if shallow:
@@ -73,15 +336,74 @@ class Dna:
 
         return available_connections
 
-    def generate_nodes(self) -> Dict[int, NodeObject]:
+    def legal_connections(self) -> int:
+        """
+        Returns the amount of connections the rules of available_connections allow between the nodes, connected or not:
+        InputNodes into HiddenNodes and OutputNodes, HiddenNodes into other HiddenNodes and OutputNodes, and OutputNodes
+        into HiddenNodes.
+        """
+        inputs, hidden, outputs = (len(numbers) for numbers in self.structure()[2])
+        return inputs * (hidden + outputs) + hidden * (hidden - 1 + outputs) + outputs * hidden
+
+    def free_connections(self) -> int:
+        """
+        Returns the amount of legal connections that don't exist yet.
+        """
+        return self.legal_connections() - len(self.structure()[0])
+
+    def connection_possible(self) -> bool:
+        """
+        Returns True if a new connection can be made, without listing the available connections.
+        """
+        return self.free_connections() > 0
+
+    def random_connection(self) -> Optional[Tuple[int, int]]:
+        """
+        Returns a random connection that can be made, uniformly out of available_connections, or None if there are
+        none. Draws legal connections until one that doesn't exist yet is found, O(1) expected while free connections
+        aren't rare.
+        """
+        # Node numbers are kept by kind in the order of NODE_TYPES. Destinations are indexed over the HiddenNodes
+        # followed by the OutputNodes, without building that list.
+        keys, _, (inputs, hidden, outputs) = self.structure()
+        legal = self.legal_connections()
+        if legal <= len(keys):
+            return None
+
+        while True:
+            index = randrange(legal)
+
+            # Into HiddenNodes and OutputNodes from an InputNode.
+            if index < len(inputs) * (len(hidden) + len(outputs)):
+                src, dst = divmod(index, len(hidden) + len(outputs))
+                src, dst = inputs[src], (hidden[dst] if dst < len(hidden) else outputs[dst - len(hidden)])
+            else:
+                index -= len(inputs) * (len(hidden) + len(outputs))
+
+                # Into other HiddenNodes and OutputNodes from a HiddenNode, skipping over the source itself.
+                if index < len(hidden) * (len(hidden) - 1 + len(outputs)):
+                    src, dst = divmod(index, len(hidden) - 1 + len(outputs))
+                    src, dst = hidden[src], (hidden[dst + (dst >= src)] if dst < len(hidden) - 1 else
+                                             outputs[dst - len(hidden) + 1])
+
+                # Into HiddenNodes from an OutputNode.
+                else:
+                    index -= len(hidden) * (len(hidden) - 1 + len(outputs))
+                    src, dst = outputs[index // len(hidden)], hidden[index % len(hidden)]
+
+            if self.edge_gene(src, dst) is None:
+                return src, dst
+
+    @staticmethod
+    def generate_nodes(inputs: int, outputs: int) -> Dict[int, NodeObject]:
         """
         Generates input and output nodes.
         """
 
         nodes = []
-        for n in range(self.inputs):
+        for n in range(inputs):
             nodes.append(InputNode(len(nodes)))
-        for n in range(self.outputs):
+        for n in range(outputs):
             nodes.append(OutputNode(len(nodes), BIAS_RANGE))
 
         return {node.number: node for node in nodes}
@@ -91,46 +413,35 @@ class Dna:
         Finds all nodes of type node_type.
         """
 
-        # Use type(x) is y, since we want exact types, ignoring inheritance.
-        return tuple(node for node in self.nodes.values() if type(node) is node_type)
-
-    def get_node_connections(self, node: NodeObject) -> Dict[str, Tuple[Connection]]:
-        """
-        Returns all connections from node and into node (src, dst).
-        :param node: Node object.
-        """
-        src = tuple(connection for connection in self.connections.values() if connection.src_number == node.number)
-        dst = tuple(connection for connection in self.connections.values() if connection.dst_number == node.number)
-
-        return {'src': src, 'dst': dst}
+        # Kinds are exact types, ignoring inheritance.
+        return tuple(NODE_TYPES[kind].gene(number, bias, GENE_ACTIVATIONS[activation])
+                     for number, kind, activation, bias in self.gene_values(self.node_genes) if kind == node_type.kind)
 
     def update(self, mutations: List[MutationObject]) -> None:
         """
-        Applies all mutations, assumes all mutations have been configured.
+        Applies all mutations, assumes all mutations have been configured. Every change replaces the gene array it
+        changes, so copies sharing the arrays are left as they are.
         """
         for mutation in mutations:
 
             if type(mutation) is WeightMutation:
-                mutation.connection.weight = mutation.new_weight
+                self.connection_genes = self.with_value(self.connection_genes, mutation.number, 'weight',
+                                                        mutation.new_weight)
 
             elif type(mutation) is BiasMutation:
-                mutation.node.bias = mutation.new_bias
+                self.node_genes = self.with_value(self.node_genes, mutation.number, 'bias', mutation.new_bias)
 
             elif type(mutation) is ConnectionMutation:
-                new_connection = mutation.connection
-                self.connections[new_connection.number] = new_connection
+                self.add_connection(mutation.connection)
 
             elif type(mutation) is NodeMutation:
-                split_connection = mutation.old_connection
-                split_connection.enabled = False
-
-                self.nodes[mutation.new_node.number] = mutation.new_node
-                self.connections[mutation.new_dst_connection.number] = mutation.new_dst_connection
-                self.connections[mutation.new_src_connection.number] = mutation.new_src_connection
+                self.connection_genes = self.with_value(self.connection_genes, mutation.connection_number, 'enabled',
+                                                        False)
 
-        # Re-map all nodes and connections.
-        self.update_connections()
-        self.hidden = len(self.get_node_by_type(HiddenNode))
+                # Splitting a connection that was split before brings back the same node.
+                self.add_node(mutation.new_node)
+                self.add_connection(mutation.new_dst_connection)
+                self.add_connection(mutation.new_src_connection)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,155 @@
+# fenwick_tree.py
+# Description: fenwick tree prefix sums, and weighted sets drawn from with them.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from typing import Dict, Hashable, List
+
+
+class FenwickTree:
+    """
+    Prefix sums over a list of non negative weights that grows and shrinks at its end. Changing a weight,
+    summing a prefix and finding the weight a running total falls in are all O(log n).
+    """
+
+    def __init__(self):
+        self.weights: List[float] = []
+
+        # One based, node i sums the weights of the lowest set bit of i positions that end at position i.
+        self.tree: List[float] = [0.0]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __getitem__(self, index: int) -> float:
+        return self.weights[index]
+
+    def prefix(self, count: int) -> float:
+        """
+        Returns the sum of the first count weights.
+        """
+        total = 0.0
+        while count:
+            total += self.tree[count]
+            count &= count - 1
+        return total
+
+    @property
+    def total(self) -> float:
+        return self.prefix(len(self.weights))
+
+    def add(self, index: int, amount: float) -> None:
+        """
+        Adds amount to the weight at index.
+        """
+        self.weights[index] += amount
+        position = index + 1
+        while position < len(self.tree):
+            self.tree[position] += amount
+            position += position & -position
+
+    def set(self, index: int, weight: float) -> None:
+        self.add(index, weight - self.weights[index])
+
+    def append(self, weight: float) -> None:
+        """
+        Adds a weight at the end, its node sums the weights of all the positions it covers.
+        """
+        position = len(self.tree)
+        self.weights.append(weight)
+        self.tree.append(weight + self.prefix(position - 1) - self.prefix(position - (position & -position)))
+
+    def pop(self) -> float:
+        """
+        Removes the last weight, no other node covers its position.
+        """
+        self.tree.pop()
+        return self.weights.pop()
+
+    def find(self, value: float) -> int:
+        """
+        Returns the index of the weight the running total passes value in, the first index whose prefix sum including
+        it is larger than value. Weights of 0 are never found, values past the total find the last index.
+        """
+        position, step = 0, 1 << (len(self.tree) - 1).bit_length() >> 1
+        while step:
+            if position + step < len(self.tree) and self.tree[position + step] <= value:
+                position += step
+                value -= self.tree[position]
+            step >>= 1
+        return min(position, len(self.weights) - 1)
+
+
+class WeightedSet:
+    """
+    A set of items with non negative weights, drawn from by weight in O(log n), or uniformly while all of them weigh 0.
+    Items are kept dense, removing an item moves the last item into its place.
+    """
+
+    def __init__(self):
+        self.items: List[Hashable] = []
+        self.index: Dict[Hashable, int] = dict()
+        self.tree = FenwickTree()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item: Hashable):
+        return item in self.index
+
+    @property
+    def total(self) -> float:
+        return self.tree.total
+
+    def weight(self, item: Hashable) -> float:
+        return self.tree[self.index[item]]
+
+    def add(self, item: Hashable, weight: float = 0.0) -> None:
+        self.index[item] = len(self.items)
+        self.items.append(item)
+        self.tree.append(weight)
+
+    def remove(self, item: Hashable) -> None:
+        index = self.index.pop(item)
+        last, weight = self.items.pop(), self.tree.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self.index[last] = index
+            self.tree.set(index, weight)
+
+    def add_weight(self, item: Hashable, amount: float) -> None:
+        self.tree.add(self.index[item], amount)
+
+    def set_weight(self, item: Hashable, weight: float) -> None:
+        self.tree.set(self.index[item], weight)
+
+    def draw(self, draw: float, excluded: Hashable = None) -> Hashable:
+        """
+        Draws an item by weight.
+        :param draw: A uniform draw in [0, 1).
+        :param excluded: An item to leave out, unless it is the only one. If it holds all the weight, the other items
+        are equally likely.
+        """
+        size, total = len(self.items), self.tree.total
+        if excluded not in self.index or size == 1:
+            return self.items[self.tree.find(draw * total) if total > 0 else int(draw * size)]
+
+        # Draw out of the weight of everything else, and skip over the excluded item.
+        index = self.index[excluded]
+        weight = self.tree[index]
+        if total - weight <= 0:
+            other = int(draw * (size - 1))
+            return self.items[other + (other >= index)]
+        value = draw * (total - weight)
+        if value >= self.tree.prefix(index):
+            value += weight
+        return self.items[self.tree.find(value)]
+
+
+if __name__ == '__main__':
+    weighted = WeightedSet()
+    for name, name_weight in zip('abcde', [0, 3, 1, 0, 6]):
+        weighted.add(name, name_weight)
+    weighted.remove('b')
+    print(weighted.items, weighted.total, [weighted.draw(d / 10) for d in range(10)])
+    print([weighted.draw(d / 10, excluded='e') for d in range(10)])
@@ -5,6 +5,8 @@ from math import sqrt
 from typing import List, Dict, Iterable, Union
 from random import gauss, random, choice, randint
 
+import numpy as np
+
 
 def print_dict(dictionary: dict):
     for key, value in dictionary.items():
@@ -113,6 +115,44 @@ def wrap(value: float, min_limit: float, max_limit: float) -> float:
     return value
 
 
+def wrap_array(values: np.ndarray, min_limit: float, max_limit: float) -> np.ndarray:
+    """
+    Simulates a round plane for every value in an array, like wrap.
+    """
+    return np.where(values > max_limit, min_limit + (values - max_limit),
+                    np.where(values < min_limit, max_limit + (values - min_limit), values))
+
+
+def cumulative_weights(weights: np.ndarray) -> np.ndarray:
+    """
+    Returns the cumulative distribution of non negative weights for weighted_draws, equal weights if they are all 0.
+    """
+    weights = np.asarray(weights, dtype=float)
+    return np.cumsum(weights if weights.sum() > 0 else np.ones(len(weights)))
+
+
+def weighted_draws(cumulative: np.ndarray, draws: np.ndarray, excluded: np.ndarray = None) -> np.ndarray:
+    """
+    Draws indices by a cumulative distribution, one for each uniform draw in [0, 1).
+    :param excluded: An index to leave out of each draw, unless it is the only one. If it holds all the weight, the
+    other indices are equally likely.
+    """
+    size, total = len(cumulative), cumulative[-1]
+    if excluded is None or size == 1:
+        return np.minimum(np.searchsorted(cumulative, draws * total, side='right'), size - 1)
+
+    # Draw out of the weight of everything else, and skip over the excluded index.
+    before = np.where(excluded > 0, cumulative[excluded - 1], 0)
+    weight = cumulative[excluded] - before
+    points = draws * (total - weight)
+    points += weight * (points >= before)
+    indices = np.minimum(np.searchsorted(cumulative, points, side='right'), size - 1)
+
+    uniform = weight >= total
+    indices[uniform] = (excluded[uniform] + 1 + (draws[uniform] * (size - 1)).astype(int)) % size
+    return indices
+
+
 def append_dict(dict_a: dict, *args: Union[List[dict], dict]) -> dict:
     """
     Appends dicts, does not handle conflicts.
@@ -135,6 +175,22 @@ def euclidian_distance(ax: float, ay: float, bx: float, by: float) -> float:
     return sqrt(pow(ax - bx, 2) + pow(ay - by, 2))
 
 
+def wrapped_difference(a: float, b: float, size: float) -> float:
+    """
+    Calculates a - b on a round axis of length size, taking the shorter way around.
+    """
+    difference = (a - b) % size
+    return difference - size if difference > size / 2 else difference
+
+
+def toroidal_distance(ax: float, ay: float, bx: float, by: float, width: float, height: float) -> float:
+    """
+    Calculates euclidian distance between two 2D points in a round world.
+    """
+
+    return sqrt(pow(wrapped_difference(ax, bx, width), 2) + pow(wrapped_difference(ay, by, height), 2))
+
+
 if __name__ == '__main__':
     # main__a = {'main__a': 1, 'b__main': 2, 'c': [1, 2]}
     # print_dict(main__a)
@@ -0,0 +1,90 @@
+# innovation_registry.py
+# Description: registry of all innovations, for giving matching innovations matching numbers.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple, Union
+
+# Constants
+from Constants.neat_parameters import INNOVATION_GENERATIONS
+# Objects
+from mutations import ConnectionMutation, Innovation
+
+
+class InnovationRegistry:
+    """
+    Maps each innovation, by its type and unique(), to the first innovation that introduced it, in O(1).
+    Innovations can be scoped to the last few generations like in the NEAT paper: when a generation starts, innovations
+    registered before the scope are compacted away, so an innovation that happens again after that gets new numbers.
+    """
+
+    def __init__(self, innovations: List[Innovation] = None, generations: Union[int, None] = INNOVATION_GENERATIONS,
+                 generation: int = 1):
+        """
+        :param generations: Amount of generations an innovation is remembered for, None remembers it for the whole run.
+        """
+        self.generations = generations
+        self.generation = generation
+
+        # Innovations with the generation they were registered in, in order of registration.
+        self.innovations: Dict[Tuple[type, Hashable], Tuple[Innovation, int]] = OrderedDict()
+        self.hits = self.misses = self.compacted = 0
+        for innovation in innovations or []:
+            self.add(innovation)
+
+    def __len__(self):
+        return len(self.innovations)
+
+    def __iter__(self):
+        return (innovation for innovation, _ in self.innovations.values())
+
+    def __str__(self):
+        return "{}(size={}, hits={}, misses={}, hit rate={:.2%}, compacted={})".format(
+            self.__class__.__name__, len(self), self.hits, self.misses, self.hit_rate, self.compacted)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+    @staticmethod
+    def key(innovation: Innovation) -> Tuple[type, Hashable]:
+        return type(innovation), innovation.unique()
+
+    def get(self, innovation: Innovation) -> Union[Innovation, None]:
+        """
+        Returns the registered innovation matching innovation, or None if it is new.
+        """
+        match = self.innovations.get(self.key(innovation))
+        if match is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return match[0]
+
+    def add(self, innovation: Innovation) -> None:
+        """
+        Registers a new innovation in the current generation, earlier registrations of the same innovation are kept.
+        """
+        self.innovations.setdefault(self.key(innovation), (innovation, self.generation))
+
+    def new_generation(self, generation: int) -> None:
+        """
+        Starts a new generation, and compacts away innovations that fell out of scope.
+        """
+        self.generation = generation
+        if self.generations is None:
+            return
+
+        # Registrations are in generation order, so everything out of scope is at the start.
+        oldest = generation - self.generations + 1
+        while self.innovations and next(iter(self.innovations.values()))[1] < oldest:
+            self.innovations.popitem(last=False)
+            self.compacted += 1
+
+
+if __name__ == '__main__':
+    registry = InnovationRegistry([ConnectionMutation(1, 1, 3)], generations=1)
+    print(registry.get(ConnectionMutation(None, 1, 3)), registry.get(ConnectionMutation(None, 2, 3)))
+    registry.new_generation(2)
+    print(registry.get(ConnectionMutation(None, 1, 3)), registry)
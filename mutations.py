@@ -4,14 +4,12 @@
 
 # Imports
 from abc import ABC, abstractmethod
-from random import random
 from typing import Union, List
 
 # Constants
 from Constants.constants import NUMBERED_MUTATION_STRING, WEIGHT_MUTATION_STRING, BIAS_MUTATION_STRING, \
     NODE_MUTATION_STRING, BASE_MUTATION_STRING
-from Constants.neat_parameters import WEIGHT_RANGE, BIAS_RANGE, WEIGHT_PERTURB_RATE, WEIGHT_PERTURB_AMOUNT, \
-    BIAS_PERTURB_RATE, BIAS_PERTURB_AMOUNT
+from Constants.neat_parameters import BIAS_RANGE
 from Constants.types import NodeObject
 from connection import Connection
 from node import HiddenNode
@@ -21,7 +19,13 @@ class Mutation(ABC):
 
     def __init__(self):
         self.name = self.__class__.__name__
-        self.string = ''
+
+    @property
+    def string(self) -> str:
+        """
+        Describes the mutation, built only when the mutation is printed.
+        """
+        return ''
 
     def __str__(self):
         return BASE_MUTATION_STRING.format(self.name, self.string)
@@ -36,7 +40,6 @@ class Innovation(ABC):
         super(Innovation, self).__init__()
         self.number = None
         self.name = self.__class__.__name__
-        self.string = ''
 
     def __str__(self):
         return NUMBERED_MUTATION_STRING.format(self.name, self.number, self.string)
@@ -44,10 +47,11 @@ class Innovation(ABC):
     def __repr__(self):
         return str(self)
 
+    @property
     @abstractmethod
-    def set_string(self) -> None:
+    def string(self) -> str:
         """
-        Builds the string that represents the mutation.
+        Describes the mutation, built only when the mutation is printed.
         """
 
     @abstractmethod
@@ -77,42 +81,38 @@ class Innovation(ABC):
 
 class WeightMutation(Mutation):
 
-    def __init__(self, connection: Connection):
+    def __init__(self, connection: Connection, new_weight: float):
         super(WeightMutation, self).__init__()
         self.connection = connection
 
         # Number of the CONNECTION this mutation updates, not the number of the mutation itself.
         self.number = connection.number
-        number, src, weight, dst = connection.number, connection.src_number, connection.weight, connection.dst_number
 
-        # Randomly choose between perturbing the weight or completely changing it.
-        if random() < WEIGHT_PERTURB_RATE:
-            self.new_weight = weight + (random() * 2 - 1) * WEIGHT_PERTURB_AMOUNT
-        else:
-            self.new_weight = random() * WEIGHT_RANGE * 2 - WEIGHT_RANGE
+        # The new weight is drawn by simulation.mutate_children().
+        self.new_weight = new_weight
 
-        # Generate mutation string.
-        self.string = WEIGHT_MUTATION_STRING.format(number, src, weight, self.new_weight, dst)
+    @property
+    def string(self) -> str:
+        connection = self.connection
+        return WEIGHT_MUTATION_STRING.format(connection.number, connection.src_number, connection.weight,
+                                             self.new_weight, connection.dst_number)
 
 
 class BiasMutation(Mutation):
 
-    def __init__(self, node: NodeObject):
+    def __init__(self, node: NodeObject, new_bias: float):
         super(BiasMutation, self).__init__()
         self.node = node
-        name, number, bias = node.name, node.number, node.bias
 
         # Number of the NODE this mutation updates, not the number of the mutation itself.
         self.number = node.number
 
-        # Randomly choose between perturbing the bias or completely changing it.
-        if random() < BIAS_PERTURB_RATE:
-            self.new_bias = self.node.bias + (random() * 2 - 1) * BIAS_PERTURB_AMOUNT
-        else:
-            self.new_bias = random() * BIAS_RANGE * 2 - BIAS_RANGE
+        # The new bias is drawn by simulation.mutate_children().
+        self.new_bias = new_bias
 
-        # Generate mutation string.
-        self.string = BIAS_MUTATION_STRING.format(name, number, bias, self.new_bias)
+    @property
+    def string(self) -> str:
+        return BIAS_MUTATION_STRING.format(self.node.name, self.node.number, self.node.bias, self.new_bias)
 
 
 class ConnectionMutation(Innovation):
@@ -126,15 +126,14 @@ class ConnectionMutation(Innovation):
         self.src_number = src_number if not connection else connection.src_number
         self.dst_number = dst_number if not connection else connection.dst_number
         self.connection = connection or Connection(self.number, self.src_number, self.dst_number)
-        self.set_string()
 
-    def set_string(self) -> None:
-        self.string = str(self.connection)
+    @property
+    def string(self) -> str:
+        return str(self.connection)
 
     def configure(self, number: int) -> None:
         self.number = number or self.number
         self.connection.number = number or self.number
-        self.set_string()
 
     def calc_configurations(self, connection_count:int, node_count: int):
         self.configure(connection_count + 1)
@@ -168,11 +167,11 @@ class NodeMutation(Innovation):
 
         # Connection that has new_node as SRC.
         self.new_src_connection = Connection(None, self.new_node.number, old_dst, old_weight)
-        self.set_string()
 
-    def set_string(self) -> None:
-        self.string = NODE_MUTATION_STRING.format(self.old_connection, self.new_dst_connection, self.new_node,
-                                                  self.new_src_connection)
+    @property
+    def string(self) -> str:
+        return NODE_MUTATION_STRING.format(self.old_connection, self.new_dst_connection, self.new_node,
+                                           self.new_src_connection)
 
     def configure(self, dst_connection_number: int, new_node_number: int, src_connection_number: int) -> None:
         """
@@ -183,7 +182,6 @@ class NodeMutation(Innovation):
         self.new_node.number = new_node_number
         self.new_src_connection.src_number = new_node_number
         self.new_src_connection.number = src_connection_number
-        self.set_string()
 
     def calc_configurations(self, connection_count: int, node_count: int):
         self.configure(connection_count + 1, node_count + 1, connection_count + 2)
@@ -0,0 +1,49 @@
+# neighbours.py
+# Description: bulk neighbour queries in the round world.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def kdtree_neighbours(positions: np.ndarray, viewers: np.ndarray, radii: np.ndarray, width: float, height: float) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the neighbours of many viewers at once with a single periodic KD-tree, built over all positions.
+    The result is in CSR form: the neighbours of viewer i are indices[offsets[i]:offsets[i + 1]], sorted.
+    :param positions: (N, 2) positions of everything in the world.
+    :param viewers: (V,) indices into positions of the viewers.
+    :param radii: (V,) line of sight of each viewer, neighbours must be strictly closer than it.
+    :return: offsets (V + 1,) and indices into positions, a viewer is never its own neighbour.
+    """
+    if cKDTree is None:
+        raise ImportError("The 'kdtree' neighbour backend requires scipy")
+
+    # The tree needs every position inside [0, size), positions outside of the world wrap into it.
+    box = np.array([width, height], dtype=float)
+    positions = np.mod(positions, box)
+    positions = np.where(positions >= box, positions - box, positions)
+
+    tree = cKDTree(positions, boxsize=box)
+    viewer_tree = cKDTree(positions[viewers], boxsize=box)
+    pairs = viewer_tree.sparse_distance_matrix(tree, max_distance=radii.max(initial=0), output_type='ndarray')
+    keep = (pairs['v'] < radii[pairs['i']]) & (viewers[pairs['i']] != pairs['j'])
+    viewer_indices, indices = pairs['i'][keep], pairs['j'][keep]
+
+    # Group by viewer.
+    order = np.lexsort((indices, viewer_indices))
+    viewer_indices, indices = viewer_indices[order], indices[order].astype(int)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(viewer_indices, minlength=len(viewers)))])
+    return offsets, indices
+
+
+if __name__ == '__main__':
+    points = np.array([[5, 5], [995, 995], [500, 500], [10, 990]], dtype=float)
+    print(kdtree_neighbours(points, np.array([0, 1]), np.array([50.0, 50.0]), 1000, 1000))
@@ -3,78 +3,321 @@
 # ---------------------------------------------------------------------------------------------------------------------
 
 # Imports
-from typing import Dict, Tuple, Union, Set, List
+from collections import OrderedDict
+from typing import Dict, Union, List, Set, Tuple
+
+import numpy as np
 
 # Constants
-from Constants.types import NodeObject
+from Constants.constants import PLAN_CACHE_SIZE
 # Objects
 from connection import Connection
-from node import InputNode, OutputNode
+from dna import Dna, GENE_ACTIVATIONS
+from mutations import BiasMutation, Innovation, MutationObject, WeightMutation
+from node import HiddenNode, InputNode, OutputNode
+
+
+class NetworkPlan:
+    """
+    The structure of a network lowered into flat arrays, so evaluating it is a single linear pass.
+    Node values live in a buffer indexed by the node's position in numbers (input nodes first). Non input nodes are
+    evaluated in order, node order[i] sums the values of sources[offsets[i]:offsets[i + 1]].
+    Connections that lie on a cycle are recurrent, they read the value their source node had on the previous step.
+    Evaluation keeps a snapshot of the previous step's values after the node values, so the buffer is twice the
+    plan's length and reads[j] is the position connection j reads: its source in the first half, or in the snapshot
+    if it is recurrent. A recurrent connection never reads a value computed earlier in the same step, whatever
+    order the nodes are evaluated in.
+    A step can evaluate several inputs at once, one for each thing a creature sees. Every input reads the same
+    previous values, and the values kept for the next step are the average over the inputs, so what the creature
+    remembers doesn't depend on the order it saw things in, and a step with one input is exactly a single
+    evaluation. Network.get_output, Network.get_output_batch and PopulationNetwork.get_output all follow this.
+    """
+
+    def __init__(self, dna: Dna, recurrent: Set[int] = None, layers: Dict[int, int] = None):
+        """
+        :param dna: The dna whose structure is lowered, read straight from its gene arrays.
+        :param recurrent: Recurrent connection numbers, found from scratch if not given.
+        :param layers: Layer of every node, found from scratch if not given.
+        """
+
+        # Input nodes take the first places in the value buffer, everything else follows by node number.
+        numbers, kinds = dna.node_genes['number'], dna.node_genes['kind']
+        input_numbers = numbers[kinds == InputNode.kind].tolist()
+        other_numbers = numbers[kinds != InputNode.kind].tolist()
+        self.numbers = input_numbers + other_numbers
+        self.index = {number: i for i, number in enumerate(self.numbers)}
+        self.inputs = np.arange(len(input_numbers))
+        self.outputs = np.array([self.index[number] for number in numbers[kinds == OutputNode.kind].tolist()],
+                                dtype=int)
+
+        # Only enabled connections take part in evaluation, as (number, src, dst) in the order of innovations.
+        genes = dna.connection_genes[dna.connection_genes['enabled']]
+        connections = list(zip(genes['number'].tolist(), genes['src'].tolist(), genes['dst'].tolist()))
+        self.recurrent = self.recurrent_connections(connections) if recurrent is None else recurrent
+        self.layers = self.node_layers(connections, self.recurrent) if layers is None else layers
+
+        # Evaluation order, by layer and then by node number.
+        self.order = np.array(sorted((self.index[number] for number in other_numbers),
+                                     key=lambda i: (self.layers[self.numbers[i]], self.numbers[i])), dtype=int)
+
+        # Lay out all incoming connections of each node in evaluation order.
+        incoming = {number: [] for number in self.numbers}
+        for number, src_number, dst_number in connections:
+            incoming[dst_number].append((number, src_number))
+        offsets, sources, connection_numbers = [0], [], []
+        for i in self.order:
+            for number, src_number in incoming[self.numbers[i]]:
+                sources.append(self.index[src_number])
+                connection_numbers.append(number)
+            offsets.append(len(sources))
+        self.offsets = np.array(offsets, dtype=int)
+        self.sources = np.array(sources, dtype=int)
+        self.connection_numbers = np.array(connection_numbers, dtype=int)
+        self.slots = {number: slot for slot, number in enumerate(connection_numbers)}
+        self.reads = self.sources + len(self.numbers) * np.isin(self.connection_numbers, list(self.recurrent))
+
+        # Positions in order where each layer starts and ends, and for each layer a matrix that sums the layer's
+        # connections into the layer's nodes, so a whole layer is evaluated with one matrix product.
+        self.layer_bounds = []
+        for position, i in enumerate(self.order):
+            if position and self.layers[self.numbers[i]] == self.layers[self.numbers[self.order[position - 1]]]:
+                self.layer_bounds[-1] = (self.layer_bounds[-1][0], position + 1)
+            else:
+                self.layer_bounds.append((position, position + 1))
+        self.layer_scatter = []
+        for start, end in self.layer_bounds:
+            scatter = np.zeros((self.offsets[end] - self.offsets[start], end - start))
+            for position in range(start, end):
+                scatter[self.offsets[position] - self.offsets[start]:
+                        self.offsets[position + 1] - self.offsets[start], position - start] = 1
+            self.layer_scatter.append(scatter)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    @staticmethod
+    def recurrent_connections(connections: List[Tuple[int, int, int]]) -> Set[int]:
+        """
+        Finds all connections that lie on a cycle, using an iterative Tarjan strongly connected components search.
+        :param connections: Connections as (number, src, dst).
+        :return: The numbers of all recurrent connections.
+        """
+        outgoing = dict()
+        for _, src_number, dst_number in connections:
+            outgoing.setdefault(src_number, []).append(dst_number)
+            outgoing.setdefault(dst_number, [])
+
+        # Iterative Tarjan, so deep networks don't hit the recursion limit.
+        index, low, component, stack, on_stack = dict(), dict(), dict(), [], set()
+        for root in outgoing:
+            if root in index:
+                continue
+            work = [(root, iter(outgoing[root]))]
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(outgoing[child])))
+                        break
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component[member] = node
+                            if member == node:
+                                break
+
+        return set(number for number, src_number, dst_number in connections
+                   if component[src_number] == component[dst_number])
+
+    def node_layers(self, connections: List[Tuple[int, int, int]], recurrent: Set[int]) -> Dict[int, int]:
+        """
+        Assigns each node the length of the longest forward path leading into it. Input nodes are layer 0, every other
+        node is at least layer 1.
+        :param connections: Connections as (number, src, dst).
+        """
+        forward = [connection for connection in connections if connection[0] not in recurrent]
+        layers = {number: 0 if i < len(self.inputs) else 1 for i, number in enumerate(self.numbers)}
+
+        # Kahn's algorithm over the forward connections.
+        in_degree = {number: 0 for number in self.numbers}
+        outgoing = {number: [] for number in self.numbers}
+        for _, src_number, dst_number in forward:
+            in_degree[dst_number] += 1
+            outgoing[src_number].append(dst_number)
+
+        ready = [number for number in self.numbers if not in_degree[number]]
+        while ready:
+            number = ready.pop()
+            for dst_number in outgoing[number]:
+                layers[dst_number] = max(layers[dst_number], layers[number] + 1)
+                in_degree[dst_number] -= 1
+                if not in_degree[dst_number]:
+                    ready.append(dst_number)
+        return layers
+
+
+class PlanCache:
+    """
+    Bounded LRU cache of network plans, keyed on the dna's structural fingerprint. Creatures with the same topology
+    share one plan, only their weights and biases are their own.
+    """
+
+    def __init__(self, size: int = PLAN_CACHE_SIZE):
+        self.size = size
+        self.plans = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, dna: Dna) -> NetworkPlan:
+        """
+        Returns the plan for the dna's structure, compiling it only if it isn't cached.
+        """
+        plan = self.plans.get(dna.fingerprint)
+        if plan is None:
+            self.misses += 1
+            plan = NetworkPlan(dna)
+            self.plans[dna.fingerprint] = plan
+            if len(self.plans) > self.size:
+                self.plans.popitem(last=False)
+        else:
+            self.hits += 1
+            self.plans.move_to_end(dna.fingerprint)
+        return plan
+
+
+plan_cache = PlanCache()
 
 
 class Network:
 
-    def __init__(self, nodes: Dict[int, NodeObject],
-                 node_connections: Dict[NodeObject, Dict[str, Tuple[Connection]]]):
-        self.nodes = nodes
-        self.node_connections = node_connections
-        self.input_nodes = [node for node in self.nodes.values() if isinstance(node, InputNode)]
-        self.output_nodes = [node for node in self.nodes.values() if isinstance(node, OutputNode)]
+    def __init__(self, dna: Dna):
+        self.plan = plan_cache.get(dna)
 
-    def get_output(self, network_inputs: List[float]) -> List[float]:
+        # Node values of the last evaluation, recurrent connections read from here.
+        self.values = np.zeros(len(self.plan))
+        self.load(dna)
+
+    def load(self, dna: Dna) -> None:
         """
-        Gets the output of the network. Evaluates main__a node's output recursively.
-        :param network_inputs: A list of floats for the network.
+        Copies the dna's weights, biases and activations into the plan's layout.
+        """
+        self.dna = dna
+        self.weights = dna.weights[np.searchsorted(dna.innovations, self.plan.connection_numbers)]
+        nodes = dna.node_genes[np.searchsorted(dna.node_genes['number'], self.plan.numbers)]
+        self.biases = np.array(nodes['bias'])
+        self.activations = [GENE_ACTIVATIONS[activation] for activation in nodes['activation'].tolist()]
+
+        # Nodes of each layer grouped by activation function, so batches apply each activation once per layer.
+        self.layer_activations = []
+        for start, end in self.plan.layer_bounds:
+            groups = dict()
+            for position in range(start, end):
+                groups.setdefault(self.activations[self.plan.order[position]], []).append(position - start)
+            self.layer_activations.append([(activation, np.array(positions), self.plan.order[start:end][positions])
+                                           for activation, positions in groups.items()])
+
+    def set_values(self, weights: Dict[int, float] = None, biases: Dict[int, float] = None) -> None:
         """
-        for node in self.nodes.values():
-            node.reset_node()
+        Writes single weights and biases by connection and node number, after the dna's values changed and its
+        structure stayed the same.
+        """
+        for number, weight in (weights or dict()).items():
+
+            # Disabled connections have no slot.
+            if number in self.plan.slots:
+                self.weights[self.plan.slots[number]] = weight
+        for number, bias in (biases or dict()).items():
+            self.biases[self.plan.index[number]] = bias
+
+    def update(self, dna: Dna, mutations: List[MutationObject]) -> None:
+        """
+        Patches the network after its dna mutated. Weight and bias mutations write a single slot, structural mutations
+        take the plan of the new structure from the plan cache and reload the network.
+        """
+        if any(isinstance(mutation, Innovation) for mutation in mutations):
+            previous = dict(zip(self.plan.numbers, self.values))
+            self.plan = plan_cache.get(dna)
+            self.values = np.array([previous.get(number, 0.0) for number in self.plan.numbers])
+            self.load(dna)
+            return
 
-        for node, value in zip(self.input_nodes, network_inputs):
-            node.set_input(value)
-        return [self.get_node_output(node) for node in self.output_nodes]
+        self.set_values({mutation.number: mutation.new_weight for mutation in mutations
+                         if type(mutation) is WeightMutation},
+                        {mutation.number: mutation.new_bias for mutation in mutations
+                         if type(mutation) is BiasMutation})
 
-    def get_node_output(self, node: NodeObject,
-                        prev_connections: Set[int] = None) -> float:
+    def get_output(self, network_inputs: List[float]) -> List[float]:
         """
-        Gets the recursive output of main__a node.
-        :param node: Node to get output of.
-        :param prev_connections: All connections that have been calculated to avoid infinite loops.
-        :return: Node's output value.
+        Gets the output of the network, evaluating every node once in topological order.
+        :param network_inputs: A list of floats for the network.
         """
+        plan, weights = self.plan, self.weights
+        values = np.concatenate((self.values, self.values))
+        inputs = min(len(plan.inputs), len(network_inputs))
+        values[plan.inputs[:inputs]] = network_inputs[:inputs]
+
+        offsets, reads = plan.offsets, plan.reads
+        for position, i in enumerate(plan.order):
+            start, end = offsets[position], offsets[position + 1]
+            total = float(values[reads[start:end]] @ weights[start:end])
+            values[i] = self.activations[i](total) + self.biases[i]
 
-        # Get all nodes that add input into node.
-        prev_connections = prev_connections or set()
-        input_connections = self.node_connections[node]['dst']
+        self.values = values[:len(plan)]
+        return self.values[plan.outputs].tolist()
 
-        # Check for calculated connections.
-        input_connections = [input_connection for input_connection in input_connections
-                             if input_connection.number not in prev_connections]
-        prev_connections.update(set(input_connection.number
-                                    for input_connection in input_connections))
+    def get_output_batch(self, network_inputs: np.ndarray) -> np.ndarray:
+        """
+        Gets the output of the network for many inputs at once, evaluating one topological layer at a time. The inputs
+        make up one step, see NetworkPlan for what recurrent connections read and the values kept for the next step.
+        :param network_inputs: An (N, inputs) matrix, extra columns are ignored like in get_output.
+        :return: An (N, outputs) matrix.
+        """
+        plan, weights = self.plan, self.weights
+        network_inputs = np.asarray(network_inputs, dtype=float)
+        if not len(network_inputs):
+            return np.zeros((0, len(plan.outputs)))
 
-        # Get each input nodes output and corresponding weight.
-        inputs = [self.get_node_output(self.nodes[input_connection.src_number], prev_connections)
-                  * input_connection.weight for input_connection in input_connections if input_connection.enabled]
+        values = np.repeat(np.concatenate((self.values, self.values))[np.newaxis], len(network_inputs), axis=0)
+        inputs = min(len(plan.inputs), network_inputs.shape[1])
+        values[:, plan.inputs[:inputs]] = network_inputs[:, :inputs]
 
-        # Set node input
-        node.set_input(inputs)
-        output = node.get_output()
+        for (start, end), scatter, groups in zip(plan.layer_bounds, plan.layer_scatter, self.layer_activations):
+            edge_start, edge_end = plan.offsets[start], plan.offsets[end]
+            totals = (values[:, plan.reads[edge_start:edge_end]] * weights[edge_start:edge_end]) @ scatter
+            for activation, positions, nodes in groups:
+                values[:, nodes] = activation(totals[:, positions]) + self.biases[nodes]
 
-        return output
+        self.values = values[:, :len(plan)].mean(axis=0)
+        return values[:, plan.outputs]
 
     def get_node_connection(self, src: int, dst: int) -> Union[Connection, None]:
         """
         Finds main__a old_connection between two nodes, returns None if there isn't one.
         """
-        out_connections = self.node_connections[self.nodes[src]]['dst']
-
-        # Get all connections outputting from the source node,
-        # and check if they output to the destination node,
-        for conn in out_connections:
-            if conn.dst_number == dst:
-                return conn
-        return None
+        return self.dna.connection_between(src, dst)
 
 
 if __name__ == '__main__':
-    pass
+
+    # A recurrent net, 3 -> 2 -> 3 is a cycle and 3 -> 3 a loop, both paths read the same previous values.
+    recurrent_dna = Dna(nodes={1: InputNode(1), 2: OutputNode(2, 1), 3: HiddenNode(3, 1)},
+                        connections={1: Connection(1, 1, 3, 0.3), 2: Connection(2, 3, 2, -0.4),
+                                     3: Connection(3, 2, 3, 0.5), 4: Connection(4, 3, 3, -0.2)})
+    single, batch = Network(recurrent_dna), Network(recurrent_dna)
+    for step_input in [1.0, 0.5, -0.3, 2.0]:
+        single_output, batch_output = single.get_output([step_input]), batch.get_output_batch([[step_input]])[0]
+        assert np.allclose(single_output, batch_output), (single_output, batch_output)
+        print(single_output, batch_output)
@@ -4,22 +4,42 @@
 
 # Imports
 import random
-from abc import ABC, abstractmethod
-from typing import Callable, List, Union
+from abc import ABC
+from typing import Union
 
 # Constants
 from Constants.constants import NODE_STRING
-from Constants.neat_parameters import sigmoid
+# Objects
+from activations import Activation, DEFAULT_ACTIVATION
 
 
 class BaseNode(ABC):
+    """
+    A node gene. Nodes hold no evaluation state, networks evaluate them from flat arrays, so node objects are small and
+    dnas can build them from their gene arrays whenever they are asked for.
+    """
+    __slots__ = 'number', 'bias', 'activation'
+
+    # Position of the node type in NODE_TYPES, stored as the kind of the node's gene.
+    kind = None
 
-    def __init__(self, number: int, activation: Callable[[float], float] = sigmoid):
+    def __init__(self, number: int, activation: Activation = DEFAULT_ACTIVATION):
         self.number = number
         self.activation = activation
-        self.name = self.__class__.__name__
         self.bias = 0
-        self.reset_node()
+
+    @classmethod
+    def gene(cls, number: int, bias: float, activation: Activation = DEFAULT_ACTIVATION) -> 'BaseNode':
+        """
+        Builds a node from the values of its gene, without drawing a random bias.
+        """
+        node = cls.__new__(cls)
+        node.number, node.bias, node.activation = number, bias, activation
+        return node
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
 
     def __str__(self):
         return NODE_STRING.format(self.name, self.number, self.bias)
@@ -27,70 +47,40 @@ class BaseNode(ABC):
     def __repr__(self):
         return str(self)
 
-    @abstractmethod
-    def get_output(self) -> float:
-        pass
-
-    @abstractmethod
-    def set_input(self, input_value: float) -> None:
-        pass
-
-    def reset_node(self) -> None:
-        self.inputs = self.output = None
-
 
 class InputNode(BaseNode):
-
-    def __init__(self, number: int, activation: Callable[[float], float] = sigmoid):
-        super(InputNode, self).__init__(number, activation)
-        self.reset_node()
-
-    def get_output(self) -> float:
-        return self.output
-
-    def set_input(self, input_value: float) -> None:
-        """
-        Sets the nodes input only if the input has not been set. To change an inputs node input, you must reset it.
-        """
-        self.inputs = self.output = input_value if self.inputs is None else self.inputs
+    __slots__ = ()
+    kind = 0
 
 
 class HiddenNode(BaseNode):
+    __slots__ = ()
+    kind = 1
 
-    def __init__(self, number: Union[int, None], bias_range: float, activation: Callable[[float], float] = sigmoid):
+    def __init__(self, number: Union[int, None], bias_range: float, activation: Activation = DEFAULT_ACTIVATION):
         super(HiddenNode, self).__init__(number, activation)
         self.bias = random.random() * bias_range * 2 - bias_range
-        self.reset_node()
-
-    def get_output(self) -> float:
-        self.output = self.activation(sum(self.inputs)) + self.bias
-        return self.output
-
-    def set_input(self, input_value: List[float]) -> None:
-        self.inputs = input_value
 
 
 class OutputNode(HiddenNode):
     """
     OutputNode is the same as HiddenNode, here for easy recognition of output nodes later on.
     """
+    __slots__ = ()
+    kind = 2
 
-    def __init__(self, number: int, bias_range: float, activation: Callable[[float], float] = sigmoid):
+    def __init__(self, number: int, bias_range: float, activation: Activation = DEFAULT_ACTIVATION):
         super(OutputNode, self).__init__(number, bias_range, activation)
 
 
+# Node types by kind.
+NODE_TYPES = InputNode, HiddenNode, OutputNode
+
+
 if __name__ == '__main__':
     inn = InputNode(0)
     hid = HiddenNode(1, 3)
     out = OutputNode(2, 2)
 
     print(inn, hid, out)
-
-    inn.set_input(432)
-    print("inn output:", inn.get_output())
-
-    hid.set_input([inn.get_output()])
-    print("hid output:", hid.get_output())
-
-    out.set_input([hid.get_output()])
-    print("out output:", out.get_output())
\ No newline at end of file
+    print(NODE_TYPES[hid.kind].gene(hid.number, hid.bias), hid.activation)
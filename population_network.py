@@ -0,0 +1,153 @@
+# population_network.py
+# Description: evaluates the networks of a whole population at once.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from typing import List
+
+import numpy as np
+
+# Objects
+from creature import Creature
+
+
+class PopulationNetwork:
+    """
+    Packs every creature's network into padded, layer aligned tensors. Each network keeps its own node slots (its plan
+    layout), padded to the biggest network, with one extra dummy slot that all padding reads from and writes into.
+    Layer l of the population holds layer l of every network, so evaluating all networks takes one gather, one
+    weighted scatter and one activation per layer.
+    """
+
+    def __init__(self):
+        self.creatures = []
+        self.index = dict()
+        self.state = np.zeros((0, 1))
+        self.dirty = True
+
+    def invalidate(self) -> None:
+        """
+        Marks the packed tensors as outdated, called whenever creatures are born, die or mutate.
+        """
+        self.dirty = True
+
+    def update(self, creatures: List[Creature]) -> None:
+        """
+        Re-packs the population if it changed since it was last packed.
+        """
+        if self.dirty:
+            self.pack(creatures)
+
+    def pack(self, creatures: List[Creature]) -> None:
+        """
+        Packs the networks of all creatures into padded tensors.
+        """
+        self.sync()
+        self.creatures = list(creatures)
+        self.index = {creature: i for i, creature in enumerate(self.creatures)}
+        self.dirty = False
+
+        networks = [creature.network for creature in self.creatures]
+        self.dummy = max((len(network.plan) for network in networks), default=0)
+        width = self.dummy + 1
+
+        # Recurrent state, inputs and outputs.
+        self.state = np.zeros((len(networks), width))
+        self.input_counts = np.array([len(network.plan.inputs) for network in networks], dtype=int)
+        self.outputs = np.full((len(networks), max((len(network.plan.outputs) for network in networks), default=0)),
+                               self.dummy, dtype=int)
+        for c, network in enumerate(networks):
+            self.state[c, :len(network.plan)] = network.values
+            self.outputs[c, :len(network.plan.outputs)] = network.plan.outputs
+
+        # Distinct activation functions, referred to by id in the tensors.
+        self.activations = []
+        activation_ids = dict()
+        for network in networks:
+            for activation in network.activations:
+                if activation not in activation_ids:
+                    activation_ids[activation] = len(self.activations)
+                    self.activations.append(activation)
+
+        # Layer aligned connection and node tensors.
+        self.layers = []
+        for layer in range(max((len(network.plan.layer_bounds) for network in networks), default=0)):
+            bounds = [network.plan.layer_bounds[layer] if layer < len(network.plan.layer_bounds) else (0, 0)
+                      for network in networks]
+            edge_width = max(network.plan.offsets[end] - network.plan.offsets[start]
+                             for network, (start, end) in zip(networks, bounds))
+            node_width = max(end - start for start, end in bounds)
+
+            sources = np.full((len(networks), edge_width), self.dummy, dtype=int)
+            destinations = np.full((len(networks), edge_width), self.dummy, dtype=int)
+            weights = np.zeros((len(networks), edge_width))
+            nodes = np.full((len(networks), node_width), self.dummy, dtype=int)
+            biases = np.zeros((len(networks), node_width))
+            activations = np.zeros((len(networks), node_width), dtype=int)
+            for c, (network, (start, end)) in enumerate(zip(networks, bounds)):
+                plan = network.plan
+                edge_start, edge_end = plan.offsets[start], plan.offsets[end]
+
+                # Recurrent connections read the copy of the previous state placed after the node slots.
+                reads = plan.reads[edge_start:edge_end]
+                sources[c, :edge_end - edge_start] = np.where(reads < len(plan), reads, reads - len(plan) + width)
+                destinations[c, :edge_end - edge_start] = np.repeat(plan.order[start:end],
+                                                                    np.diff(plan.offsets[start:end + 1]))
+                weights[c, :edge_end - edge_start] = network.weights[edge_start:edge_end]
+                nodes[c, :end - start] = plan.order[start:end]
+                biases[c, :end - start] = network.biases[plan.order[start:end]]
+                activations[c, :end - start] = [activation_ids[network.activations[i]] for i in plan.order[start:end]]
+            self.layers.append((sources, destinations, weights, nodes, biases, activations))
+
+    def sync(self) -> None:
+        """
+        Writes the recurrent state back into each creature's own network.
+        """
+        for creature, state in zip(self.creatures, self.state):
+            creature.network.values = state[:len(creature.network.plan)].copy()
+
+    def get_output(self, creature_indices: np.ndarray, network_inputs: np.ndarray) -> np.ndarray:
+        """
+        Evaluates many (creature, input) pairs at once, the inputs of each creature make up one step of its network,
+        see NetworkPlan for what recurrent connections read and the state kept for the next step.
+        :param creature_indices: (M,) position of the creature thinking about each input, in self.creatures. Must be
+                                 sorted, so the inputs of each creature are consecutive rows.
+        :param network_inputs: (M, inputs) matrix, extra columns are ignored like in Network.get_output.
+        :return: (M, outputs) matrix, each row is the output of the creature's network.
+        """
+        creature_indices = np.asarray(creature_indices, dtype=int)
+        network_inputs = np.asarray(network_inputs, dtype=float)
+        if not len(creature_indices):
+            return np.zeros((0, self.outputs.shape[1]))
+        rows, width = len(creature_indices), self.dummy + 1
+
+        # Start from the previous values, with a copy for recurrent connections to read, and fill in the inputs.
+        values = np.tile(self.state[creature_indices], 2)
+        inputs = min(network_inputs.shape[1], self.dummy)
+        input_mask = np.arange(inputs) < self.input_counts[creature_indices, np.newaxis]
+        values[:, :inputs] = np.where(input_mask, network_inputs[:, :inputs], values[:, :inputs])
+
+        row_offsets = (np.arange(rows) * width)[:, np.newaxis]
+        for sources, destinations, weights, nodes, biases, activations in self.layers:
+            weighted = np.take_along_axis(values, sources[creature_indices], axis=1) * weights[creature_indices]
+            totals = np.bincount((row_offsets + destinations[creature_indices]).ravel(), weighted.ravel(),
+                                 minlength=rows * width).reshape(rows, width)
+
+            layer_nodes = nodes[creature_indices]
+            layer_totals = np.take_along_axis(totals, layer_nodes, axis=1)
+            layer_activations = activations[creature_indices]
+            outputs = np.zeros_like(layer_totals)
+            for activation_id, activation in enumerate(self.activations):
+                outputs = np.where(layer_activations == activation_id, activation(layer_totals), outputs)
+            np.put_along_axis(values, layer_nodes, outputs + biases[creature_indices], axis=1)
+
+        # The new recurrent state of each creature is the average of its rows, summed one segment of rows at a time.
+        starts = np.flatnonzero(np.diff(creature_indices, prepend=-1))
+        counts = np.diff(np.append(starts, rows))
+        self.state[creature_indices[starts]] = np.add.reduceat(values[:, :width], starts) / counts[:, np.newaxis]
+
+        return np.take_along_axis(values, self.outputs[creature_indices], axis=1)
+
+
+if __name__ == '__main__':
+    pass
@@ -4,29 +4,36 @@
 
 # Imports
 import time
-from copy import deepcopy
-from random import choice, randint, random
+from collections import ChainMap
+from random import choice, getrandbits, randint, random, randrange, sample
 from typing import Dict, List, Tuple, Iterator
 
 import numpy as np
-from numpy import average, math
 
 # Constants
-from Constants.constants import CREATURE_COLORS, CREATURE_SCALE, DEBUG, FOOD_SCALE, FOOD_SIZE, SIMULATION_HEIGHT, \
-    SIMULATION_WIDTH, SPEED_SCALING, FOOD_TIME_START, TEXT_ONLY, SIMULATION_REPORT, PRINT_FREQUENCY
+from Constants.constants import CREATURE_COLORS, CREATURE_REACH, CREATURE_SCALE, DEBUG, FOOD_SCALE, FOOD_SIZE, \
+    SIMULATION_WIDTH, SPEED_SCALING, FOOD_TIME_START, TEXT_ONLY, SIMULATION_REPORT, PRINT_FREQUENCY, \
+    NEIGHBOUR_BACKEND
 from Constants.data_structures import CreatureActions, CreatureNetworkInput, CreatureNetworkOutput, \
     Location
-from Constants.neat_parameters import BASE_DNA, BIAS_MUTATION_RATE, BIAS_RANGE, BIG_SPECIES, BOTTOM_PERCENT, \
-    CONNECTION_MUTATION_RATE, CREATURE_INPUTS, CREATURE_OUTPUTS, CROSSOVER_RATE, DELTA_WEIGHT_CONSTANT, \
-    DISJOINT_CONSTANT, DISTANCE_THRESHOLD, EXCESS_CONSTANT, INTER_SPECIES_MATE, MAX_AGE, MAX_FOOD_AMOUNT, NEW_CHILDREN, \
-    NODE_MUTATION_RATE, POPULATION_SIZE, WEIGHT_MUTATION_RATE, MATING_URGE_THRESHOLD
+from Constants.neat_parameters import BASE_DNA, BIAS_MUTATION_RATE, BIAS_PERTURB_AMOUNT, BIAS_PERTURB_RATE, \
+    BIAS_RANGE, BIG_SPECIES, BOTTOM_PERCENT, CONNECTION_MUTATION_RATE, CREATURE_INPUTS, CREATURE_OUTPUTS, \
+    CROSSOVER_RATE, DELTA_WEIGHT_CONSTANT, DISJOINT_CONSTANT, DISTANCE_THRESHOLD, EXCESS_CONSTANT, INTER_SPECIES_MATE, \
+    MAX_AGE, MAX_FOOD_AMOUNT, NEW_CHILDREN, NODE_MUTATION_RATE, POPULATION_SIZE, WEIGHT_MUTATION_RATE, \
+    WEIGHT_PERTURB_AMOUNT, WEIGHT_PERTURB_RATE, WEIGHT_RANGE, MATING_URGE_THRESHOLD
 # Objects
 from creature import Creature
 from dna import Dna
 from food import Food
-from functions import append_dict, clamp, euclidian_distance, flatten, ignore, sum_one, wrap
-from mutations import BiasMutation, ConnectionMutation, Innovation, MutationObject, NodeMutation, WeightMutation
+from functions import cumulative_weights, ignore, wrap_array, weighted_draws, wrapped_difference
+from innovation_registry import InnovationRegistry
+from mutations import ConnectionMutation, Innovation, MutationObject, NodeMutation
+from neighbours import kdtree_neighbours
 from node import InputNode, OutputNode
+from population_network import PopulationNetwork
+from spatial_hash import SpatialHash
+from species_registry import SpeciesRegistry
+from world import CREATURE, FOOD, World
 
 
 class Simulation:
@@ -45,96 +52,185 @@ class Simulation:
         self.world_width = width
         self.world_height = height
         self.creature_scale = creature_scale
-        self.innovation_history = []
 
         # All attributes that can be changed in creature info.
         self.creature_actions = 'x', 'y'
 
         # Define genotype that starts evolution, and set innovation history, connection and node count accordingly.
-        base_dna, self.innovation_history = self.base_dna()
-        self.connection_count = len(self.innovation_history) + 1
-        self.node_count = len(base_dna.nodes) + 1
+        base_dna, base_innovations = self.base_dna()
+        self.innovation_history = InnovationRegistry(base_innovations, generation=self.generation)
+        self.connection_count = len(base_innovations) + 1
+        self.node_count = len(base_dna.node_genes) + 1
 
-        # Map creatures to creature info named tuples.
-        self.population = dict(self.initialize_child() for _ in range(self.population_size))
+        # Draws the random decisions of bulk mutations, seeded from random so seeding random seeds everything.
+        self.generator = np.random.default_rng(getrandbits(64))
 
-        # Categorize different species.
-        self.species = {}
-        self.update_species()
+        # Everything in the world is kept in struct of arrays storage, locations are views into it.
+        # The spatial hash indexes the world by entity id, for line of sight queries.
+        self.world = World(self.world_width, self.world_height)
+        self.grid = SpatialHash(self.world_width, self.world_height)
+
+        # Evaluates the networks of the whole population at once.
+        self.population_network = PopulationNetwork()
+
+        # Map creatures to their locations, and categorize different species.
+        self.population = {}
+        self.species = SpeciesRegistry()
+        for _ in range(self.population_size):
+            self.add_child(*self.initialize_child())
+        self.catalogue_creatures(list(self.population))
 
         # Creatures scheduled to die.
         self.dead_creatures = []
 
-        # Generate food.
+        # Generate food, and index it by position for eating. A food's radius is largest when it spawns full.
         self.foods = {}
+        self.max_food_radius = MAX_FOOD_AMOUNT * FOOD_SIZE * MAX_FOOD_AMOUNT * FOOD_SCALE
+        self.food_grid = SpatialHash(self.world_width, self.world_height,
+                                     self.max_food_radius + CREATURE_REACH * self.creature_scale)
         self.new_food(population_size)
 
-        # Generate world.
-        self.world_info = {}
-        self.update_world()
+        # Everything in the world mapped to its location.
+        self.world_info = ChainMap(self.population, self.foods)
 
         if TEXT_ONLY:
             self.report = SIMULATION_REPORT
 
-    def update_world(self) -> None:
-        """
-        Updates world_info.
-        """
-        # Add all object in the world and their info into the world info dictionary.
-        self.world_info = append_dict(self.population, self.foods)
-
     def update(self) -> None:
         """
         Runs a single frame of the simulation.
         """
         self.simulation_time += 1
 
+        # A new generation starts every generation time, innovations are scoped by it.
+        if self.simulation_time % self.generation_time == 0:
+            self.generation += 1
+            self.innovation_history.new_generation(self.generation)
+
         if self.simulation_time % PRINT_FREQUENCY == 0 and TEXT_ONLY:
             print(self.report.format(self.generation, self.simulation_time, len(self.population), len(self.species),
                                      self.current_best))
 
-        # Get creature's thoughts about all other creatures.
-        for creature, creature_location in self.population.items():
-            objects_in_view = [(other, other_info) for other, other_info in
-                               ignore(self.world_info.items(), (creature, creature_location))
-                               if euclidian_distance(creature_location.x, creature_location.y,
-                                                     other_info.x, other_info.y) < creature.line_of_sight]
-            creature_decisions = [creature.think(self.info_to_vec(creature_location, other, other_info))
-                                  for other, other_info in objects_in_view]
-            creature_actions = self.interpret_decisions(list(zip(objects_in_view, creature_decisions)))
-            self.apply_action(creature, creature_location, creature_actions)
-
-            # Add fitness to creature based on his actions.
-            # Add 1 for each frame creature is alive.
-            self.update_creature_properties(creature, creature_actions)
-
-            # Check if creature ate a food.
-            # Food can only be eaten after 30 seconds of simulation, to avoid spawn eating.
-            if self.simulation_time > FOOD_TIME_START:
-                for food, food_location in self.foods.items():
-                    distance = euclidian_distance(food_location.x, food_location.y, creature_location.x,
-                                                  creature_location.y)
-                    distance -= food.amount * FOOD_SIZE * food_location.scale
-                    if distance < creature.reach * creature_location.scale:
-                        self.creature_eat(creature, food)
-
-        # Kill creatures that died.
-        self.kill_creatures()
-
-        # Simulate a round world for the creatures.
-        self.wrap_creatures()
-        self.update_world()
+        # The tick runs in three phases. Sense and think only read the world, which stays frozen until the commit
+        # phase writes every creature's action at once, so nothing depends on the order creatures are processed in.
+        creatures = list(self.population)
+        creature_ids = np.array([self.population[creature].id for creature in creatures], dtype=int)
+        viewers, neighbours, network_inputs = self.sense(creature_ids)
+        decisions = self.think(creatures, viewers, network_inputs)
+        self.commit(creatures, creature_ids, viewers, decisions)
 
         # Find the best creature.
         self.current_best = max(self.population, key=lambda c: c.fitness).fitness
 
-    def apply_action(self, creature: Creature, creature_location: Location, creature_actions: CreatureActions) -> None:
+    def sense(self, creature_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Applies the action the creature decided to do.
+        Sense phase, finds everything each creature sees and builds the network inputs. Only reads the world.
+        :param creature_ids: (N,) entity ids of the population, in order.
+        :return: (M,) index of the creature LOOKING in each pair, (M,) entity id of the object SEEN and the (M, 3)
+                 network inputs.
         """
-        for attr in self.creature_actions:
-            creature_attr, action_attr = getattr(creature_location, attr), getattr(creature_actions, attr)
-            setattr(creature_location, attr, creature_attr + action_attr)
+        offsets, neighbours = self.find_neighbours(creature_ids)
+        viewers = np.repeat(np.arange(len(creature_ids)), np.diff(offsets))
+        return viewers, neighbours, self.info_to_vec_batch(creature_ids[viewers], neighbours)
+
+    def think(self, creatures: List[Creature], viewers: np.ndarray, network_inputs: np.ndarray) -> np.ndarray:
+        """
+        Think phase, gets all creature's thoughts about all other creatures in one evaluation.
+        :return: (M, 6) network outputs.
+        """
+        self.population_network.update(creatures)
+
+        # Creatures are in the order they were packed and viewers are sorted, so the indices stay sorted.
+        creature_indices = np.array([self.population_network.index[creature] for creature in creatures], dtype=int)
+        return self.population_network.get_output(creature_indices[viewers], network_inputs)
+
+    def commit(self, creatures: List[Creature], creature_ids: np.ndarray, viewers: np.ndarray,
+               decisions: np.ndarray) -> None:
+        """
+        Commit phase, applies everything the creatures decided in bulk: moves them, feeds them and kills them.
+        """
+
+        # Move the whole population at once, in a round world.
+        moves, _ = self.interpret_decisions_batch(viewers, decisions, len(creatures))
+        displacements = self.apply_actions(creature_ids, moves)
+
+        # Add fitness to creatures based on their actions.
+        # Add 1 for each frame creature is alive.
+        self.update_creature_properties(creatures, displacements)
+
+        # Food can only be eaten after 30 seconds of simulation, to avoid spawn eating.
+        if self.simulation_time > FOOD_TIME_START:
+            self.feed_creatures(creatures, creature_ids)
+
+        # Kill creatures that died.
+        self.kill_creatures()
+
+    def feed_creatures(self, creatures: List[Creature], creature_ids: np.ndarray) -> None:
+        """
+        Lets every creature eat the foods in its reach. A food can feed as many creatures as it has amount (at least
+        one), the closest creatures eat first and ties go to the lower entity id.
+        """
+        reaches = np.array([creature.reach for creature in creatures], dtype=float) * self.world.scale[creature_ids]
+        candidates = [np.array(self.food_grid.query(self.world.x[creature_id], self.world.y[creature_id],
+                                                    reach + self.max_food_radius), dtype=int)
+                      for creature_id, reach in zip(creature_ids.tolist(), reaches.tolist())]
+        rows = np.repeat(np.arange(len(creatures)), [len(food_ids) for food_ids in candidates])
+        food_ids = np.concatenate(candidates) if candidates else np.zeros(0, dtype=int)
+
+        # Check which creatures reach which foods.
+        amounts = np.array([self.world.objects[food_id].amount for food_id in food_ids.tolist()], dtype=float)
+        distances = self.world.distances(creature_ids[rows], food_ids)
+        in_reach = distances - amounts * FOOD_SIZE * self.world.scale[food_ids] < reaches[rows]
+        rows, food_ids, distances, amounts = rows[in_reach], food_ids[in_reach], distances[in_reach], amounts[in_reach]
+
+        # Rank the creatures reaching each food, and only let as many eat as the food has.
+        order = np.lexsort((creature_ids[rows], distances, food_ids))
+        rows, food_ids, amounts = rows[order], food_ids[order], amounts[order]
+        group_starts = np.flatnonzero(np.r_[True, food_ids[1:] != food_ids[:-1]]) if len(food_ids) else food_ids
+        ranks = np.arange(len(food_ids)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(food_ids)]))
+        eats = ranks < np.maximum(amounts, 1)
+        for row, food_id in zip(rows[eats].tolist(), food_ids[eats].tolist()):
+            self.creature_eat(creatures[row], self.world.objects[food_id])
+
+    def find_neighbours(self, creature_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds everything each creature sees, in CSR form: creature i sees the entity ids
+        neighbours[offsets[i]:offsets[i + 1]], sorted.
+        :param creature_ids: Entity ids of the population, in order.
+        :return: offsets and neighbours.
+        """
+        radii = np.array([creature.line_of_sight for creature in self.population], dtype=float)
+        if NEIGHBOUR_BACKEND == 'kdtree':
+            entity_ids = self.world.alive_ids()
+            offsets, indices = kdtree_neighbours(self.world.positions(entity_ids),
+                                                 np.searchsorted(entity_ids, creature_ids), radii,
+                                                 self.world_width, self.world_height)
+            return offsets, entity_ids[indices]
+
+        offsets, neighbours = [0], []
+        for creature_id, line_of_sight in zip(creature_ids, radii):
+            candidates = np.array([entity_id for entity_id in self.grid.query(self.world.x[creature_id],
+                                                                              self.world.y[creature_id],
+                                                                              line_of_sight)
+                                   if entity_id != creature_id], dtype=int)
+            seen = np.sort(candidates[self.world.distances(creature_id, candidates) < line_of_sight])
+            neighbours.append(seen)
+            offsets.append(offsets[-1] + len(seen))
+        return np.array(offsets), np.concatenate(neighbours)
+
+    def apply_actions(self, creature_ids: np.ndarray, moves: np.ndarray) -> np.ndarray:
+        """
+        Applies the movement all creatures decided to do at once.
+        :param creature_ids: (N,) entity ids of the creatures.
+        :param moves: (N, 2) change in x and y of each creature, in the order of CreatureActions.
+        :return: (N,) distance each creature moved.
+        """
+        # The new positions are built aside and written at once, wrapped around the round world.
+        x = wrap_array(self.world.x[creature_ids] + moves[:, 0], 0, self.world_width)
+        y = wrap_array(self.world.y[creature_ids] + moves[:, 1], 0, self.world_height)
+        self.world.x[creature_ids], self.world.y[creature_ids] = x, y
+        self.grid.move_many(creature_ids.tolist(), self.world.x[creature_ids], self.world.y[creature_ids])
+        return np.hypot(moves[:, 0], moves[:, 1])
 
     def info_to_vec(self, creature_info: Location, other, other_info: Location) -> CreatureNetworkInput:
         """
@@ -145,9 +241,9 @@ class Simulation:
         :return: Network input for creature LOOKING at creature SEEN.
         """
         if isinstance(other_info, Location):
-            # Calculate dx and dy.
-            dx = (creature_info.x - other_info.x) / self.world_width
-            dy = (creature_info.y - other_info.y) / self.world_height
+            # Calculate dx and dy, the shorter way around the round world.
+            dx = wrapped_difference(creature_info.x, other_info.x, self.world_width) / self.world_width
+            dy = wrapped_difference(creature_info.y, other_info.y, self.world_height) / self.world_height
             type = int(isinstance(other, Food))
 
             # Build network input.
@@ -156,51 +252,16 @@ class Simulation:
         else:
             raise NotImplementedError("Creatures can only 'see' other creatures and foods")
 
-    def constrain_creatures(self, x_min: int = 0, y_min: int = 0, x_max: int = SIMULATION_WIDTH,
-                            y_max: int = SIMULATION_HEIGHT) -> None:
-        """
-        Makes sure all creatures stay within given borders (default is screen size).
-        """
-        for creature_info in self.population.values():
-            creature_info.x = clamp(creature_info.x, x_min, x_max)
-            creature_info.y = clamp(creature_info.y, y_min, y_max)
-
-    def wrap_creatures(self, x_min: int = 0, y_min: int = 0, x_max: int = SIMULATION_WIDTH,
-                       y_max: int = SIMULATION_HEIGHT) -> None:
+    def info_to_vec_batch(self, viewer_ids: np.ndarray, seen_ids: np.ndarray) -> np.ndarray:
         """
-        Simulates a round world.
+        Batched info_to_vec, converts many (LOOKING, SEEN) entity pairs at once.
+        :param viewer_ids: (M,) entity ids of the creatures LOOKING.
+        :param seen_ids: (M,) entity ids of the objects SEEN.
+        :return: (M, 3) matrix, each row is a CreatureNetworkInput.
         """
-        for creature_info in self.population.values():
-            creature_info.x = wrap(creature_info.x, x_min, x_max)
-            creature_info.y = wrap(creature_info.y, y_min, y_max)
-
-    @staticmethod
-    def weight_mutation(creature: Creature) -> WeightMutation:
-        """
-        Return main__a weight mutation object from the creature. A weight mutation has no number, the object is here
-        for organization purposes. ALWAYS returns main__a mutation, random chance is handle in simulation.mutate().
-        """
-
-        # Choose random connection.
-        connection = choice(list(creature.dna.connections.values()))
-
-        # Generate random weight mutation.
-        mutation = WeightMutation(connection)
-        return mutation
-
-    @staticmethod
-    def bias_mutation(creature: Creature) -> BiasMutation:
-        """
-        Return main__a weight mutation object from the creature. A weight mutation has no number, the object is here
-        for organization purposes. ALWAYS returns main__a mutation, random chance is handle in simulation.mutate().
-        """
-
-        # Choose random node.
-        node = choice(list(creature.dna.nodes.values()))
-
-        # Generate random weight mutation.
-        mutation = BiasMutation(node)
-        return mutation
+        dx, dy = self.world.differences(viewer_ids, seen_ids)
+        return np.column_stack([dx / self.world_width, dy / self.world_height,
+                                self.world.kind[seen_ids] == FOOD]).astype(float)
 
     @staticmethod
     def connection_mutation(creature: Creature) -> ConnectionMutation:
@@ -208,11 +269,8 @@ class Simulation:
         Returns main__a new old_connection mutation based on the creature.
         """
 
-        # Get all creature dna's nodes and connections.
-        available_connections = creature.dna.available_connections()
-
-        # Choose random connection to generate.
-        src, dst = choice(available_connections)
+        # Choose random connection to generate out of the creature dna's available connections.
+        src, dst = creature.dna.random_connection()
 
         # Generate new connection between nodes.
         mutation = ConnectionMutation(None, src, dst)
@@ -224,35 +282,13 @@ class Simulation:
         Returns main__a new node mutation based on the creature.
         """
 
-        # Choose main__a random connection to split.
-        connection = choice(list(creature.dna.connections.values()))
+        # Choose a random connection to split.
+        connection = creature.dna.connection_at(randrange(len(creature.dna.connection_genes)))
 
         # Generate node mutation.
         mutation = NodeMutation(connection)
         return mutation
 
-    def mutate(self, creature: Creature) -> List[MutationObject]:
-        """
-        Get mutations based on the creature, based on random chance and neat_parameter values.
-        """
-        mutations = []
-
-        # Weight and bias mutations.
-        if random() < WEIGHT_MUTATION_RATE and creature.dna.connections:
-            mutations.append(self.weight_mutation(creature))
-        if random() < BIAS_MUTATION_RATE and creature.dna.nodes:
-            mutations.append(self.bias_mutation(creature))
-
-        # Check if main__a connection is possible if random wants to mutate main__a connection.
-        if creature.dna.available_connections(shallow=True) and random() < CONNECTION_MUTATION_RATE:
-            mutations.append(self.connection_mutation(creature))
-
-        # Node mutation.
-        if random() < NODE_MUTATION_RATE and creature.dna.connections:
-            mutations.append(self.node_mutation(creature))
-
-        return mutations
-
     @staticmethod
     def apply_mutations(creature: Creature, mutations: List[MutationObject]) -> None:
         """
@@ -260,54 +296,97 @@ class Simulation:
         """
         creature.update(mutations)
 
-    def generate_mutations(self, creature: Creature) -> List[MutationObject]:
+    def configure_innovations(self, mutations: List[MutationObject]) -> List[MutationObject]:
         """
-        Generates mutations for all new creatures, and configures them.
-        :return: All mutations for each creature.
+        Configures the innovations among the mutations, innovations that happened before get their past numbers.
+        :return: The mutations.
         """
-
-        # Generate innovations.
-        mutations = self.mutate(creature)
         innovations = [mutation for mutation in mutations if isinstance(mutation, Innovation)]
 
         # Configure innovations.
         for innovation in innovations:
-            for past_innovation in self.innovation_history:
-                if innovation.unique() == past_innovation.unique():
-                    innovation.configure(*past_innovation.configurations())
-                    break
+            past_innovation = self.innovation_history.get(innovation)
+            if past_innovation is not None:
+                innovation.configure(*past_innovation.configurations())
+
             # If no innovations were matching in past innovations, increment connection and node count.
             # And add innovation to innovation history.
             else:
                 self.connection_count, self.node_count = innovation.calc_configurations(self.connection_count,
                                                                                         self.node_count)
-                self.innovation_history.append(innovation)
+                self.innovation_history.add(innovation)
         return mutations
 
+    def mutate_children(self, children: List[Creature]) -> None:
+        """
+        Mutates newborns in bulk. All random decisions of the batch come from one draw of the generator, weights and
+        biases are perturbed or drawn anew with array operations. Only structural mutations are built as mutation
+        objects, per child.
+        """
+        if not children:
+            return
+
+        dnas = [child.dna for child in children]
+        connection_counts = np.array([len(dna.connection_genes) for dna in dnas])
+        node_counts = np.array([len(dna.node_genes) for dna in dnas])
+        draws = self.generator.random((len(children), 10))
+
+        # Weight mutations pick a connection, and either perturb its weight or draw a new one.
+        weighted = np.flatnonzero((draws[:, 0] < WEIGHT_MUTATION_RATE) & (connection_counts > 0))
+        genes = (np.cumsum(connection_counts) - connection_counts)[weighted] + (
+            draws[weighted, 1] * connection_counts[weighted]).astype(int)
+        numbers = np.concatenate([dna.innovations for dna in dnas])[genes]
+        perturbed = draws[weighted, 2] < WEIGHT_PERTURB_RATE
+        new_weights = np.where(perturbed, np.concatenate([dna.weights for dna in dnas])[genes], 0) + (
+            draws[weighted, 3] * 2 - 1) * np.where(perturbed, WEIGHT_PERTURB_AMOUNT, WEIGHT_RANGE)
+        weights = {i: {number: weight} for i, number, weight in
+                   zip(weighted.tolist(), numbers.tolist(), new_weights.tolist())}
+
+        # Bias mutations, the same for a node.
+        biased = np.flatnonzero((draws[:, 4] < BIAS_MUTATION_RATE) & (node_counts > 0))
+        genes = (np.cumsum(node_counts) - node_counts)[biased] + (draws[biased, 5] * node_counts[biased]).astype(int)
+        numbers = np.concatenate([dna.node_genes['number'] for dna in dnas])[genes]
+        perturbed = draws[biased, 6] < BIAS_PERTURB_RATE
+        new_biases = np.where(perturbed, np.concatenate([dna.node_genes['bias'] for dna in dnas])[genes], 0) + (
+            draws[biased, 7] * 2 - 1) * np.where(perturbed, BIAS_PERTURB_AMOUNT, BIAS_RANGE)
+        biases = {i: {number: bias} for i, number, bias in
+                  zip(biased.tolist(), numbers.tolist(), new_biases.tolist())}
+
+        # Structural mutations are built per child.
+        for i, (child, (connection_draw, node_draw)) in enumerate(zip(children, draws[:, 8:].tolist())):
+            child.dna.set_values(weights.get(i), biases.get(i))
+            child.network.set_values(weights.get(i), biases.get(i))
+
+            mutations = []
+            if connection_draw < CONNECTION_MUTATION_RATE and child.dna.connection_possible():
+                mutations.append(self.connection_mutation(child))
+            if node_draw < NODE_MUTATION_RATE and len(child.dna.connection_genes):
+                mutations.append(self.node_mutation(child))
+
+            if mutations:
+                self.apply_mutations(child, self.configure_innovations(mutations))
+
     def add_child(self, child: Creature, child_info: Location) -> None:
         """
-        Adds a child to the population
+        Adds a child to the population, the caller assigns it to a species.
         """
-        self.population[child] = child_info
-
-        # Assign the child to a species.
-        self.catalogue_creature(child)
+        self.population[child] = self.world.add(child, child_info, CREATURE)
+        self.population_network.invalidate()
+        self.grid.insert(self.population[child].id, child_info.x, child_info.y)
 
     def new_birth(self, parents: Tuple[Creature, Creature]) -> Tuple[Creature, Location]:
         """
-        Generate new creature from two parents, or generate it by mutating one of the parents.
+        Generate new creature from two parents, or generate it from one of the parents. The caller mutates it, see
+        mutate_children.
         """
 
         # Generate child dna from crossover of parents, or pick one of the parent's dna.
         if random() < CROSSOVER_RATE:
             dna = self.crossover(*parents)
         else:
-            dna = deepcopy(choice(parents).dna)
+            dna = choice(parents).dna.copy()
 
-        child, child_info = self.initialize_child(dna, parents)
-        self.apply_mutations(child, self.generate_mutations(child))
-
-        return child, child_info
+        return self.initialize_child(dna, parents)
 
     def initialize_child(self, dna: Dna = None, parents: Tuple[Creature, Creature] = None) -> Tuple[Creature, Location]:
         """
@@ -332,10 +411,7 @@ class Simulation:
         """
         Returns the species representative of creature.
         """
-        for rep, species in self.species.items():
-            if creature in species:
-                return rep
-        raise Exception("Shouldn't be reachable")
+        return self.species.species_of(creature)
 
     def crossover(self, parent_a: Creature, parent_b: Creature) -> Dna:
         """
@@ -361,8 +437,9 @@ class Simulation:
 
         # If there is a fit parent, inherit disjoint and matching genes from it.
         if fit_parent:
+            fit_connections = a_connections if fit_parent is parent_a else b_connections
             for number in non_matching:
-                if number in fit_parent.dna.connections:
+                if number in fit_connections:
                     child_gene_sources[number] = fit_parent
 
         # If both parents are equally fit, inherit disjoint and excess genes randomly.
@@ -373,37 +450,42 @@ class Simulation:
                 elif number in b_connections:
                     child_gene_sources[number] = parent_b
 
-        # Add all genes the child should inherit.
-        child_connections = dict()
-        child_nodes = dict()
-        for number, parent in child_gene_sources.items():
-            connection = parent.dna.connections[number]
-            child_connections[number] = connection
-            src_number, dst_number = connection.src_number, connection.dst_number
-            child_nodes[src_number] = parent.dna.nodes[src_number]
-            child_nodes[dst_number] = parent.dna.nodes[dst_number]
+        # Add all genes the child should inherit, straight from the parents' gene arrays. Nodes are inherited from the
+        # same parent as the connections that use them, a node both parents pass on comes from parent_a.
+        node_genes, connection_genes = [], []
+        for parent in (parent_a, parent_b):
+            numbers = [number for number, source in child_gene_sources.items() if source is parent]
+            genes = parent.dna.connection_genes[np.isin(parent.dna.connection_genes['number'], numbers)]
+            nodes = parent.dna.node_genes
+            node_genes.append(nodes[np.isin(nodes['number'], np.concatenate((genes['src'], genes['dst'])))])
+            connection_genes.append(genes)
 
         # Generate child.
-        child_dna = Dna(nodes=child_nodes, connections=child_connections)
+        child_dna = Dna.from_genes(np.concatenate(node_genes), np.concatenate(connection_genes))
         return child_dna
 
-    def creature_death(self, creature: Creature) -> None:
+    def creature_death(self, creature: Creature) -> Creature:
         """
         Handles the death of a creature.
 
         Removes the creature from the population dictionary and generates a new child in its place.
         Calls add_child, new_birth.
+        :return: The new child, not yet mutated or assigned to a species.
         """
 
         # Choose parents.
         parent_a, parent_b = self.get_parents()
 
         # Birth new child, to replace dead creature.
-        self.add_child(*self.new_birth((parent_a, parent_b)))
+        child, child_info = self.new_birth((parent_a, parent_b))
+        self.add_child(child, child_info)
 
         # Kill creature
-        del self.population[creature]
-        self.species[self.get_species(creature)].remove(creature)
+        self.grid.remove(self.population.pop(creature).id)
+        self.world.remove(creature)
+        self.population_network.invalidate()
+        self.species.remove(creature)
+        return child
 
     def catalogue_creature(self, creature: Creature) -> None:
         """
@@ -412,50 +494,56 @@ class Simulation:
         for species_representative in self.species:
             if self.genetic_distance(creature, species_representative) < DISTANCE_THRESHOLD:
                 creature.colors = species_representative.colors
-                self.species[species_representative].append(creature)
+                self.species.add(creature, species_representative)
                 break
         else:
             creature.colors = next(self.colors)
-            self.species[creature] = [creature]
+            self.species.add(creature)
+
+    def catalogue_creatures(self, creatures: List[Creature]) -> None:
+        """
+        Catalogues many creatures at once, with the same result as calling catalogue_creature on each of them in order.
+        Distances to the existing species representatives come from one genetic_distances pass, only species founded
+        by earlier creatures of the batch are checked one by one.
+        """
+        representatives = list(self.species)
+        distances = self.genetic_distances(creatures, representatives)
+        matches = distances < DISTANCE_THRESHOLD
+
+        # The batched distances can differ from genetic_distance in the last bits, settle close calls exactly.
+        for i, j in zip(*np.nonzero(np.abs(distances - DISTANCE_THRESHOLD) < 1e-9)):
+            matches[i, j] = self.genetic_distance(creatures[i], representatives[j]) < DISTANCE_THRESHOLD
+
+        new_representatives = []
+        for creature, creature_matches in zip(creatures, matches):
+            if creature_matches.any():
+                species_representative = representatives[int(creature_matches.argmax())]
+            else:
+                species_representative = next((representative for representative in new_representatives
+                                               if self.genetic_distance(creature, representative) < DISTANCE_THRESHOLD),
+                                              None)
+
+            if species_representative is None:
+                creature.colors = next(self.colors)
+                self.species.add(creature)
+                new_representatives.append(creature)
+            else:
+                creature.colors = species_representative.colors
+                self.species.add(creature, species_representative)
 
     @staticmethod
     def compare_genomes(creature_a: Creature, creature_b: Creature):
         """"
         Generate matching, disjoint and excess gene lists for two creature's dna.
         """
-        # Get both creatures connection genes. Reminder: Connections is main__a dict => {innovation number: connection}
-        a_connections = creature_a.dna.connections
-        b_connections = creature_b.dna.connections
-
-        # Check which creature has the latest innovation.
-        a_max = max(a_connections.keys())
-        b_max = max(b_connections.keys())
-
-        # Calculate disjoint-excess cutoff.
-        cutoff = min(a_max, b_max)
-        max_number = max(a_max, b_max)
-
-        # Get matching, disjoint and excess genes.
-        matching_genes = []
-        disjoint_genes = []
-        excess_genes = []
-
-        # Line up corresponding mutations by number.
-        a_compare = [None if num not in a_connections else a_connections[num].number for num in range(max_number + 1)]
-        b_compare = [None if num not in b_connections else b_connections[num].number for num in range(max_number + 1)]
-        for a_num, b_num in zip(a_compare, b_compare):
+        # Get both creatures innovation numbers.
+        a_connections = set(creature_a.dna.innovations.tolist())
+        b_connections = set(creature_b.dna.innovations.tolist())
 
-            # Matching genes.
-            if a_num == b_num and a_num:
-                matching_genes.append(a_num)
-
-            # Disjoint genes.
-            elif (a_num or b_num) and (a_num or b_num) < cutoff:
-                disjoint_genes.append(a_num or b_num)
-
-            # Excess genes.
-            elif a_num or b_num:
-                excess_genes.append(a_num or b_num)
+        # Line up corresponding genes by innovation number.
+        matching_genes, disjoint_genes, excess_genes, max_number, _ = creature_a.dna.compare_genes(creature_b.dna)
+        matching_genes, disjoint_genes, excess_genes = matching_genes.tolist(), disjoint_genes.tolist(), \
+            excess_genes.tolist()
         return matching_genes, disjoint_genes, excess_genes, max_number, a_connections, b_connections
 
     def genetic_distance(self, creature_a: Creature, creature_b: Creature) -> float:
@@ -463,17 +551,60 @@ class Simulation:
         Returns main__a float between 0 and 1, shows how similar two creatures are. They lower this value is, the more
         similar the two creatures are.
         """
-        matching_genes, disjoint_genes, excess_genes, max_number, a_connections, b_connections = self.compare_genomes \
-            (creature_a, creature_b)
+        matching_genes, disjoint_genes, excess_genes, max_number, delta_weights = \
+            creature_a.dna.compare_genes(creature_b.dna)
 
         # Calculate genetic distance.
         c1, c2, c3 = EXCESS_CONSTANT, DISJOINT_CONSTANT, DELTA_WEIGHT_CONSTANT
-        delta_weights = average([abs(a_connections[number].weight - b_connections[number].weight) for number in
-                                 matching_genes])
         genetic_distance = (c1 * len(excess_genes) / max_number) + (c2 * len(disjoint_genes) / max_number) + \
                            (c3 * delta_weights)
         return genetic_distance
 
+    @staticmethod
+    def genetic_distances(creatures: List[Creature], others: List[Creature]) -> np.ndarray:
+        """
+        Batched genetic_distance, the distance of every creature to every other creature in one pass. The genomes are
+        laid out as rows over the innovation numbers they use, so the cost follows the size of the genomes.
+        :return: (len(creatures), len(others)) matrix.
+        """
+        if not creatures or not others:
+            return np.zeros((len(creatures), len(others)))
+        dnas = [creature.dna for creature in creatures] + [other.dna for other in others]
+        numbers = np.unique(np.concatenate([dna.innovations for dna in dnas]))
+        present = np.zeros((len(dnas), len(numbers)), dtype=bool)
+        weights = np.zeros((len(dnas), len(numbers)))
+        for row, dna in enumerate(dnas):
+            columns = np.searchsorted(numbers, dna.innovations)
+            present[row, columns] = True
+            weights[row, columns] = dna.weights
+        latest = np.array([dna.innovations[-1] for dna in dnas])
+
+        # Amount of genes of each genome numbered below each column.
+        below = np.concatenate([np.zeros((len(dnas), 1), dtype=int), np.cumsum(present, axis=1)], axis=1)
+        a, b = slice(None, len(creatures)), slice(len(creatures), None)
+
+        # Matching genes, and matching genes below the disjoint-excess cutoff. The cutoff is the latest gene of one of
+        # the two genomes, so it is the only matching gene that isn't below it.
+        matching = present[a].astype(int) @ present[b].astype(int).T
+        cutoffs = np.searchsorted(numbers, np.minimum(latest[a, np.newaxis], latest[np.newaxis, b]))
+        matching_below = matching - (np.take_along_axis(present[a], cutoffs, axis=1) &
+                                     np.take_along_axis(present[b], cutoffs.T, axis=1).T)
+
+        # Non matching genes below the cutoff are disjoint, the rest are excess.
+        disjoint = np.take_along_axis(below[a], cutoffs, axis=1) + np.take_along_axis(below[b], cutoffs.T, axis=1).T \
+            - 2 * matching_below
+        excess = present[a].sum(axis=1)[:, np.newaxis] + present[b].sum(axis=1)[np.newaxis] - 2 * matching - disjoint
+        max_number = np.maximum(latest[a, np.newaxis], latest[np.newaxis, b])
+
+        both = present[a][:, np.newaxis] & present[b][np.newaxis]
+        weight_differences = (np.abs(weights[a][:, np.newaxis] - weights[b][np.newaxis]) * both).sum(axis=2)
+        with np.errstate(invalid='ignore'):
+            delta_weights = weight_differences / matching
+
+        # Calculate genetic distance.
+        c1, c2, c3 = EXCESS_CONSTANT, DISJOINT_CONSTANT, DELTA_WEIGHT_CONSTANT
+        return (c1 * excess / max_number) + (c2 * disjoint / max_number) + (c3 * delta_weights)
+
     def update_species(self, new_creature: Creature = None) -> None:
         """
         Generates a dictionary with a creature as a key and all creatures in the population that are similar to it,
@@ -486,32 +617,31 @@ class Simulation:
         if new_creature is None:
 
             # Find all creatures not catalogued into a species.
-            all_creatures = flatten(list(self.species.values()))
-            uncatalogued_creatures = [creature for creature in self.population if creature not in all_creatures]
+            uncatalogued_creatures = [creature for creature in self.population if not self.species.catalogued(creature)]
         else:
 
             # Can save time if new creature is specified
             uncatalogued_creatures = [new_creature]
 
-        while uncatalogued_creatures:
-            creature = choice(uncatalogued_creatures)
-            self.catalogue_creature(creature)
-            uncatalogued_creatures.remove(creature)
+        # Catalogue in random order.
+        self.catalogue_creatures(sample(uncatalogued_creatures, len(uncatalogued_creatures)))
 
-    def update_creature_properties(self, creature: Creature, creature_actions: CreatureActions) -> None:
+    def update_creature_properties(self, creatures: List[Creature], displacements: np.ndarray) -> None:
         """
-        Updates the creature properties according to its actions.
+        Updates the properties of all creatures according to how far each of them moved.
         """
 
         # The more the creature moves, the higher its fitness.
-        distance = math.sqrt(math.pow(creature_actions.x, 2) + math.pow(creature_actions.y, 2))
-        creature.fitness += distance
-        creature.distance_travelled += distance
-        creature.age += 1
-        if int(creature.distance_travelled) % 30 == 0:
-            creature.age -= 5
-        if creature.age >= MAX_AGE:
-            self.dead_creatures.append(creature)
+        distances = displacements.tolist()
+        for creature, distance in zip(creatures, distances):
+            creature.fitness += distance
+            creature.distance_travelled += distance
+            creature.age += 1
+            if int(creature.distance_travelled) % 30 == 0:
+                creature.age -= 5
+            if creature.age >= MAX_AGE:
+                self.dead_creatures.append(creature)
+        self.species.add_fitness_many(creatures, distances)
 
     def get_parents(self) -> Tuple[Creature, Creature]:
         """
@@ -519,84 +649,71 @@ class Simulation:
         In the future the creatures should learn how to do this.
         """
 
-        # Adjust fitness levels based on explicit fitness sharing.
-        fitness_levels = dict()
-        for rep, species in self.species.items():
-            fitness_levels[rep] = dict()
-
-            # Each creatures fitness is divided by the amount of creatures in its species.
-            for creature in species:
-                fitness_levels[rep][creature] = creature.fitness / len(species)
-
-        # Choose a species.
-        # TODO 10/22/18 get_parents: Use numpy weighted choice.
-        a_species = choice(list(self.species.keys()))
+        # Choose a species by its shared fitness, explicit fitness sharing is kept up to date by the species registry.
+        a_species = self.species.draw_species(random())
 
         # Choose the first parent from the species chosen.
-        # Choose the second one from the same species, unless inter-species mating occurs.
-        b_species = choice(ignore(list(self.species.keys()), a_species)) if random() < INTER_SPECIES_MATE else a_species
+        # Choose the second one from the same species, unless inter-species mating occurs. With only one species, or
+        # only one creature in the species, it mates within it.
+        b_species = self.species.draw_species(random(), a_species) if random() < INTER_SPECIES_MATE else a_species
 
-        # Return parents.
-        parent_a = choice(self.species[a_species])
-        parent_b = choice(ignore(self.species[b_species], parent_a))
+        # Return parents, chosen by fitness.
+        parent_a = self.species.draw_creature(a_species, random())
+        parent_b = self.species.draw_creature(b_species, random(), parent_a)
         return parent_a, parent_b
 
     def new_generation(self) -> Dict[Creature, Location]:
         """
-        Generates a new generation based on the fitness levels of each creature and each species.
+        Generates a new generation based on the fitness levels of each creature and each species. Selection
+        distributions are computed once, and all parents of a species are drawn together.
         """
 
         # Kill bottom percent of each species.
-        survivors = dict(self.species)
-        for rep, species in survivors.items():
-            survivors[rep] = sorted(species, key=lambda c: c.fitness)[int(len(species) * BOTTOM_PERCENT):]
-
-        species_fitness = dict()
-
-        # Adjust fitness levels based on explicit fitness sharing.
-        fitness_levels = dict()
-        for rep, species in survivors.items():
-            fitness_levels[rep] = dict()
-
-            # Each creatures fitness is divided by the amount of creatures in its species.
-            for creature in species:
-                fitness_levels[rep][creature] = creature.fitness / len(species)
-
-        # The fitness of a species is the sum of all the adjusted fitness levels of its creatures.
-        for rep, species in survivors.items():
-            species_fitness[rep] = sum([fitness_levels[rep][creature] for creature in species])
+        survivors = {rep: sorted(species, key=lambda c: c.fitness)[int(len(species) * BOTTOM_PERCENT):]
+                     for rep, species in self.species.items()}
+        representatives = list(survivors)
+
+        # Explicit fitness sharing divides each creature's fitness by the amount of creatures in its species, which
+        # doesn't change the odds within a species. The fitness of a species is the sum of the adjusted
+        # fitness levels of its creatures.
+        cumulative, species_fitness = [], []
+        for species in survivors.values():
+            fitness = np.array([creature.fitness for creature in species], dtype=float)
+            cumulative.append(cumulative_weights(fitness))
+            species_fitness.append(fitness.sum() / len(species))
+        species_cumulative = cumulative_weights(species_fitness)
 
         # Generate new generation using survivors as parents.
-        new_generation = dict()
-        for rep, species in survivors.items():
-            new_species = []
+        new_generation, children = dict(), []
+        for s, species in enumerate(survivors.values()):
 
-            # Species with more than BIG SPECIES amount of networks keep their champion.
-            if len(new_species) > BIG_SPECIES:
+            # Species with more than BIG SPECIES amount of networks keep their champion, where it is now. World
+            # locations are views that later moves change, so the champion keeps a copy.
+            if len(species) > BIG_SPECIES:
                 champion = max(species, key=lambda c: c.fitness)
-                new_species.append(champion)
-            for i in range(len(species) + NEW_CHILDREN):
-                parent_b_species = rep
-
-                # Choose parent a.
-                parent_a_probabilities = sum_one(list(fitness_levels[rep].values()))
-                parent_a = np.random.choice(species, p=parent_a_probabilities)
-                species_p = sum_one(species_fitness.values())
-                if random() < INTER_SPECIES_MATE:
-                    parent_b_species = np.random.choice(survivors, p=species_p)
-
-                # Choose parent b.
-                parent_b_options = ignore(survivors[parent_b_species], parent_a)
-
-                # If mate species contains only one creature, it will mate with itself.
-                if not parent_b_options:
-                    parent_b_options = survivors[parent_b_species]
-                parent_b_probabilities = sum_one([fitness_levels[parent_b_species][creature]
-                                                  for creature in parent_b_options])
-                parent_b = np.random.choice(parent_b_options, p=parent_b_probabilities)
-                child, child_info = self.new_birth((parent_a, parent_b))
+                location = self.population[champion]
+                new_generation[champion] = Location(location.x, location.y, location.scale)
+
+            amount = len(species) + NEW_CHILDREN
+            draws = self.generator.random((amount, 4))
+            parents_a = weighted_draws(cumulative[s], draws[:, 0])
+
+            # Parent b comes from the same species unless inter-species mating occurs, and is never parent a unless
+            # its species has only one creature, then it mates with itself.
+            mate_species = np.full(amount, s)
+            inter_species = draws[:, 1] < INTER_SPECIES_MATE
+            mate_species[inter_species] = weighted_draws(species_cumulative, draws[inter_species, 2])
+            parents_b = np.empty(amount, dtype=int)
+            for t in np.unique(mate_species).tolist():
+                mates = mate_species == t
+                parents_b[mates] = weighted_draws(cumulative[t], draws[mates, 3], parents_a[mates] if t == s else None)
+
+            for a, t, b in zip(parents_a.tolist(), mate_species.tolist(), parents_b.tolist()):
+                child, child_info = self.new_birth((species[a], survivors[representatives[t]][b]))
                 new_generation[child] = child_info
+                children.append(child)
 
+        self.mutate_children(children)
         return new_generation
 
     def new_food(self, total: int, remove: Food = None) -> None:
@@ -606,10 +723,16 @@ class Simulation:
 
         for _ in range(total):
             food = Food(randint(0, self.world_width), randint(0, self.world_height), randint(0, MAX_FOOD_AMOUNT))
-            self.foods[food] = Location(food.x, food.y, food.amount * FOOD_SCALE)
+            food_location = self.foods[food] = self.world.add(food, Location(food.x, food.y, food.amount * FOOD_SCALE),
+                                                              FOOD)
+            self.grid.insert(food_location.id, food.x, food.y)
+            self.food_grid.insert(food_location.id, food.x, food.y)
 
         if remove:
-            del self.foods[remove]
+            food_id = self.foods.pop(remove).id
+            self.grid.remove(food_id)
+            self.food_grid.remove(food_id)
+            self.world.remove(remove)
 
     def creature_eat(self, creature: Creature, food: Food) -> None:
         """
@@ -620,6 +743,7 @@ class Simulation:
             print(creature, "is eating", food)
         creature.health = min(creature.health + 10, 100)
         creature.fitness += 10
+        self.species.add_fitness(creature, 10)
         food.amount -= 1
         if food.amount <= 0:
             self.new_food(1, remove=food)
@@ -629,10 +753,12 @@ class Simulation:
         Kill all creatures in dead creatures array.
         """
 
-        # Make sure there are no duplicates in dead creatures.
-        self.dead_creatures = set(self.dead_creatures)
-        for creature in self.dead_creatures:
-            self.creature_death(creature)
+        # Make sure there are no duplicates in dead creatures, keeping the order they died in.
+        # Their children join species together, after all deaths are handled.
+        self.dead_creatures = dict.fromkeys(self.dead_creatures)
+        children = [self.creature_death(creature) for creature in self.dead_creatures]
+        self.mutate_children(children)
+        self.catalogue_creatures(children)
 
         # Reset dead creatures.
         self.dead_creatures = []
@@ -727,6 +853,37 @@ class Simulation:
         actions = CreatureActions(move_x, move_y, best_mate)
         return actions
 
+    @staticmethod
+    def interpret_decisions_batch(viewers: np.ndarray, decisions: np.ndarray, creature_count: int) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched interpret_decisions, reduces the decisions of all creatures at once.
+        :param viewers: (M,) sorted index of the creature that made each decision.
+        :param decisions: (M, 6) matrix, each row is a CreatureNetworkOutput.
+        :param creature_count: Amount of creatures.
+        :return: (creature_count, 2) movement of each creature, in the order of CreatureActions, and the row of each
+                 creature's best mate decision, -1 if it has none.
+        """
+        left, right, up, down, urgency, mate = decisions.T
+
+        # Avg out everything the creatures want to do, using a weighted average against the urgency of each
+        # decision. Sometimes a creature can't 'see' anything, so its total would be 0.
+        move_x = np.select([right > left, right < left], [right * urgency, -left * urgency], 0)
+        move_y = np.select([up > down, up < down], [up * urgency, -down * urgency], 0)
+        totals = np.bincount(viewers, minlength=creature_count)
+        moves = np.column_stack([np.bincount(viewers, move_x, minlength=creature_count),
+                                 np.bincount(viewers, move_y, minlength=creature_count)])
+        moves[totals > 0] = moves[totals > 0] * SPEED_SCALING / totals[totals > 0, np.newaxis]
+
+        # The best mate is the first of the most urgent decisions that want to mate.
+        mates = np.full(creature_count, -1, dtype=int)
+        urges = np.where((mate > MATING_URGE_THRESHOLD) & (urgency > -1), urgency, -np.inf)
+        rows = np.lexsort((np.arange(len(viewers)), -urges, viewers))
+        firsts = rows[np.r_[True, viewers[rows][1:] != viewers[rows][:-1]]] if len(rows) else rows
+        firsts = firsts[urges[firsts] > -np.inf]
+        mates[viewers[firsts]] = firsts
+        return moves, mates
+
 
 if __name__ == '__main__':
     print("Starting Simulation...")
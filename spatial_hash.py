@@ -0,0 +1,103 @@
+# spatial_hash.py
+# Description: uniform grid spatial hash over the round world.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from math import ceil
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+
+# Constants
+from Constants.constants import CREATURE_LINE_OF_SIGHT, SIMULATION_HEIGHT, SIMULATION_WIDTH
+
+
+class SpatialHash:
+    """
+    Buckets objects into a grid of cells that tiles the world. The world is round, so cells on one edge neighbour the
+    cells on the opposite edge, and positions outside of the world fall into the cell they would wrap into.
+    """
+
+    def __init__(self, width: float = SIMULATION_WIDTH, height: float = SIMULATION_HEIGHT,
+                 cell_size: float = CREATURE_LINE_OF_SIGHT):
+
+        # Cells are at least cell_size wide and tile the world exactly.
+        self.columns = max(1, int(width // cell_size))
+        self.rows = max(1, int(height // cell_size))
+        self.cell_width = width / self.columns
+        self.cell_height = height / self.rows
+
+        # Each cell is an insertion ordered set of objects.
+        self.cells: Dict[Tuple[int, int], Dict[Hashable, None]] = dict()
+        self.object_cells: Dict[Hashable, Tuple[int, int]] = dict()
+
+    def __len__(self):
+        return len(self.object_cells)
+
+    def __contains__(self, thing: Hashable):
+        return thing in self.object_cells
+
+    def cell(self, x: float, y: float) -> Tuple[int, int]:
+        """
+        Returns the cell a position falls into.
+        """
+        return int(x // self.cell_width) % self.columns, int(y // self.cell_height) % self.rows
+
+    def insert(self, thing: Hashable, x: float, y: float) -> None:
+        """
+        Adds an object at a position.
+        """
+        cell = self.object_cells[thing] = self.cell(x, y)
+        self.cells.setdefault(cell, dict())[thing] = None
+
+    def remove(self, thing: Hashable) -> None:
+        """
+        Removes an object.
+        """
+        cell = self.object_cells.pop(thing)
+        del self.cells[cell][thing]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def move(self, thing: Hashable, x: float, y: float) -> None:
+        """
+        Moves an object to a new position, only touching the cells if it changed cell.
+        """
+        if self.object_cells[thing] != self.cell(x, y):
+            self.remove(thing)
+            self.insert(thing, x, y)
+
+    def move_many(self, things: Sequence[Hashable], xs: np.ndarray, ys: np.ndarray) -> None:
+        """
+        Moves many objects at once, cells are computed for all of them together and only objects that changed cell
+        are touched.
+        """
+        columns = (np.floor_divide(xs, self.cell_width).astype(int) % self.columns).tolist()
+        rows = (np.floor_divide(ys, self.cell_height).astype(int) % self.rows).tolist()
+        for thing, column, row, x, y in zip(things, columns, rows, xs, ys):
+            if self.object_cells[thing] != (column, row):
+                self.remove(thing)
+                self.insert(thing, x, y)
+
+    def query(self, x: float, y: float, radius: float) -> List[Hashable]:
+        """
+        Returns all objects in cells that are within radius of the position, across the world's edges. The caller
+        filters the candidates by their exact distance.
+        """
+        column, row = self.cell(x, y)
+        reach_x, reach_y = ceil(radius / self.cell_width), ceil(radius / self.cell_height)
+        columns = {(column + dx) % self.columns for dx in range(-reach_x, reach_x + 1)}
+        rows = {(row + dy) % self.rows for dy in range(-reach_y, reach_y + 1)}
+
+        return [thing for cell_column in columns for cell_row in rows
+                for thing in self.cells.get((cell_column, cell_row), ())]
+
+
+if __name__ == '__main__':
+    grid = SpatialHash(1000, 1000, 100)
+    grid.insert('a', 5, 5)
+    grid.insert('b', 995, 995)
+    grid.insert('c', 500, 500)
+    print(grid.query(0, 0, 50))
+    grid.move('c', 1040, 20)
+    print(grid.query(0, 0, 50))
@@ -0,0 +1,133 @@
+# species_registry.py
+# Description: registry of all species and the creatures in them.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List
+
+# Objects
+from creature import Creature
+from fenwick_tree import WeightedSet
+
+
+class SpeciesRegistry(Mapping):
+    """
+    Maps each species representative to the creatures in its species, in the order they joined, and each creature back
+    to its species representative. Looking up creatures is O(1), and the fitness of every creature and the shared
+    fitness of every species are kept in weighted sets as creatures come and go, so adding and removing creatures,
+    changing their fitness and drawing them by fitness are O(log n). A species dies with its last creature.
+    """
+
+    def __init__(self):
+        # Each species is an insertion ordered set of creatures.
+        self.members: Dict[Creature, Dict[Creature, None]] = dict()
+        self.representatives: Dict[Creature, Creature] = dict()
+
+        # Creatures of each species by fitness, and species by shared fitness.
+        self.fitness: Dict[Creature, WeightedSet] = dict()
+        self.shared = WeightedSet()
+
+    def __getitem__(self, representative: Creature) -> List[Creature]:
+        return list(self.members[representative])
+
+    def __iter__(self) -> Iterator[Creature]:
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def size(self, representative: Creature) -> int:
+        return len(self.members[representative])
+
+    def total_fitness(self, representative: Creature) -> float:
+        """
+        Returns the sum of the fitness of all creatures in the species.
+        """
+        return self.fitness[representative].total
+
+    def shared_fitness(self, representative: Creature) -> float:
+        """
+        Returns the sum of the adjusted fitness levels of the species, each creature's fitness divided by the amount of
+        creatures in its species.
+        """
+        return self.shared.weight(representative)
+
+    def species_of(self, creature: Creature) -> Creature:
+        """
+        Returns the species representative of creature.
+        """
+        return self.representatives[creature]
+
+    def catalogued(self, creature: Creature) -> bool:
+        return creature in self.representatives
+
+    def add(self, creature: Creature, representative: Creature = None) -> None:
+        """
+        Adds a creature to the species of representative, or founds a new species with the creature as its
+        representative.
+        """
+        if representative is None:
+            representative = creature
+            self.members[representative] = dict()
+            self.fitness[representative] = WeightedSet()
+            self.shared.add(representative)
+        self.members[representative][creature] = None
+        self.representatives[creature] = representative
+        self.fitness[representative].add(creature, creature.fitness)
+        self.update_shared(representative)
+
+    def remove(self, creature: Creature) -> None:
+        """
+        Removes a creature from its species, the species dies if it was the last one in it.
+        """
+        representative = self.representatives.pop(creature)
+        del self.members[representative][creature]
+        self.fitness[representative].remove(creature)
+        if not self.members[representative]:
+            del self.members[representative]
+            del self.fitness[representative]
+            self.shared.remove(representative)
+        else:
+            self.update_shared(representative)
+
+    def update_shared(self, representative: Creature) -> None:
+        """
+        Sets the shared fitness of the species, its creatures' fitness divided by the amount of creatures in it.
+        """
+        self.shared.set_weight(representative, self.fitness[representative].total / len(self.members[representative]))
+
+    def add_fitness(self, creature: Creature, amount: float) -> None:
+        """
+        Keeps the fitness totals up to date, called whenever a creature's fitness changes by amount.
+        """
+        representative = self.representatives[creature]
+        self.fitness[representative].add_weight(creature, amount)
+        self.update_shared(representative)
+
+    def add_fitness_many(self, creatures: Iterable[Creature], amounts: Iterable[float]) -> None:
+        """
+        Like add_fitness for many creatures, the shared fitness of each species is updated once.
+        """
+        changed = dict()
+        for creature, amount in zip(creatures, amounts):
+            representative = changed[creature] = self.representatives[creature]
+            self.fitness[representative].add_weight(creature, amount)
+        for representative in dict.fromkeys(changed.values()):
+            self.update_shared(representative)
+
+    def draw_species(self, draw: float, excluded: Creature = None) -> Creature:
+        """
+        Draws a species representative by shared fitness, see WeightedSet.draw.
+        """
+        return self.shared.draw(draw, excluded)
+
+    def draw_creature(self, representative: Creature, draw: float, excluded: Creature = None) -> Creature:
+        """
+        Draws a creature of the species by fitness, see WeightedSet.draw.
+        """
+        return self.fitness[representative].draw(draw, excluded)
+
+
+if __name__ == '__main__':
+    pass
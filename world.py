@@ -0,0 +1,155 @@
+# world.py
+# Description: struct of arrays store of everything in the world.
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Imports
+from typing import Dict, Hashable, List, Tuple
+
+import numpy as np
+
+# Constants
+from Constants.constants import SIMULATION_HEIGHT, SIMULATION_WIDTH
+from Constants.data_structures import Location
+
+# Entity kinds.
+CREATURE, FOOD = 0, 1
+
+
+class EntityLocation(Location):
+    """
+    Location of an entity, a thin view over the world's arrays.
+    """
+    __slots__ = 'world', 'id'
+
+    def __init__(self, world: 'World', entity_id: int):
+        self.world = world
+        self.id = entity_id
+
+    @property
+    def x(self) -> float:
+        return self.world.x[self.id]
+
+    @x.setter
+    def x(self, value: float) -> None:
+        self.world.x[self.id] = value
+
+    @property
+    def y(self) -> float:
+        return self.world.y[self.id]
+
+    @y.setter
+    def y(self, value: float) -> None:
+        self.world.y[self.id] = value
+
+    @property
+    def scale(self) -> float:
+        return self.world.scale[self.id]
+
+    @scale.setter
+    def scale(self, value: float) -> None:
+        self.world.scale[self.id] = value
+
+
+class World:
+    """
+    Keeps the position, scale, kind and alive flag of every entity in contiguous arrays, indexed by integer entity id.
+    Ids of removed entities are reused.
+    """
+
+    def __init__(self, width: float = SIMULATION_WIDTH, height: float = SIMULATION_HEIGHT, capacity: int = 64):
+        self.width = width
+        self.height = height
+
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.scale = np.zeros(capacity)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # Entity id to object and back.
+        self.objects: List[Hashable] = [None] * capacity
+        self.ids: Dict[Hashable, int] = dict()
+        self.free: List[int] = []
+        self.count = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, thing: Hashable, location: Location, kind: int) -> EntityLocation:
+        """
+        Adds an entity to the world.
+        :return: View of the entity's location.
+        """
+        if self.free:
+            entity_id = self.free.pop()
+        else:
+            if self.count == len(self.x):
+                self.grow()
+            entity_id = self.count
+            self.count += 1
+
+        self.x[entity_id], self.y[entity_id], self.scale[entity_id] = location.x, location.y, location.scale
+        self.kind[entity_id] = kind
+        self.alive[entity_id] = True
+        self.objects[entity_id] = thing
+        self.ids[thing] = entity_id
+        return EntityLocation(self, entity_id)
+
+    def remove(self, thing: Hashable) -> None:
+        """
+        Removes an entity from the world, its id will be reused.
+        """
+        entity_id = self.ids.pop(thing)
+        self.alive[entity_id] = False
+        self.objects[entity_id] = None
+        self.free.append(entity_id)
+
+    def grow(self) -> None:
+        """
+        Doubles the capacity of all arrays.
+        """
+        capacity = len(self.x)
+        for name in ('x', 'y', 'scale', 'kind', 'alive'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(capacity, dtype=array.dtype)]))
+        self.objects += [None] * capacity
+
+    def location(self, entity_id: int) -> EntityLocation:
+        """
+        Returns a view of an entity's location.
+        """
+        return EntityLocation(self, entity_id)
+
+    def alive_ids(self) -> np.ndarray:
+        """
+        Returns the ids of all entities in the world, sorted.
+        """
+        return np.flatnonzero(self.alive[:self.count])
+
+    def positions(self, entity_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns an (N, 2) array of the entities' positions.
+        """
+        return np.column_stack([self.x[entity_ids], self.y[entity_ids]])
+
+    def differences(self, a_ids: np.ndarray, b_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns a - b in x and y, the shorter way around the round world.
+        """
+        dx = (self.x[a_ids] - self.x[b_ids]) % self.width
+        dy = (self.y[a_ids] - self.y[b_ids]) % self.height
+        return dx - self.width * (dx > self.width / 2), dy - self.height * (dy > self.height / 2)
+
+    def distances(self, a_ids: np.ndarray, b_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the distances between entities, the shorter way around the round world.
+        """
+        return np.hypot(*self.differences(a_ids, b_ids))
+
+
+if __name__ == '__main__':
+    w = World(1000, 1000, capacity=1)
+    a = w.add('a', Location(5, 5, 1), CREATURE)
+    b = w.add('b', Location(995, 995, 1), FOOD)
+    a.x += 10
+    print(a, b, w.distances(a.id, b.id), w.alive_ids())